@@ -0,0 +1,194 @@
+# ==============================================================================
+# BENCHMARK DO PCP: TEMPO E MEMÓRIA POR ETAPA, DE 50 A 100 MIL MEMBROS
+# ==============================================================================
+# Uso:
+#   python benchmark_pcp.py [--tamanhos 50 500 5000 50000 100000] [--repeticoes 3]
+#                           [--saida resultados_benchmark] [--comparar arquivo.json] [--limiar 1.25]
+#
+# Cada execução grava um JSON em --saida e é comparada com a anterior (ou com
+# --comparar), apontando as etapas que ficaram mais lentas que o limiar.
+
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gerador_pcp import planilha_sintetica
+from motor_pcp import (
+    CARDS_POR_PAGINA, DATE_COLUMNS, FONTES_LOCAIS, FORMATO_DATA, MAX_MEMBROS_GANTT_EQUIPE,
+    abrir_fonte, aplicar_filtros, calculo_afinidade, calculo_alocacoes, calculo_disponibilidade, carregar_todas_abas,
+    concatenar_abas, concatenar_alocacoes, converter_datas, disponibilidade_semanal, figura_gantt_equipe,
+    figura_gantt_membro, html_card_membro, html_cards, indices_filtros, nota_disponibilidade, salvar_fonte_local,
+    sensibilidade_pesos, tabela_alocacoes, varrer_datas_inicio,
+)
+
+TAMANHOS_PADRAO = [50, 500, 5000, 50000, 100000]
+DIRETORIO_RESULTADOS = Path("resultados_benchmark")
+MAX_FIGURAS_GANTT = 200  # Figuras de Gantt montadas por tamanho (o custo é por membro)
+CORES_PADRAO = ("#064381", "#decda9")
+
+
+def medir(funcao, repeticoes):
+    """Executa `funcao` e devolve o melhor tempo, a mediana (s) e o pico de memória alocada (MiB)."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    # O tracemalloc deixa o código mais lento: o pico é medido em uma execução à parte
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(tempos), float(np.median(tempos)), pico / 2**20
+
+def datas_por_coluna(brutas):
+    """Conversão anterior a `converter_datas`: um `pd.to_datetime` por coluna de data, aba por aba."""
+    for pcp_df in brutas:
+        for date_col in DATE_COLUMNS:
+            if date_col in pcp_df.columns:
+                pcp_df[date_col] = pd.to_datetime(pcp_df[date_col], format=FORMATO_DATA, errors='coerce')
+
+def etapas(n_membros, seed):
+    """Monta os dados sintéticos e devolve as etapas a medir, na ordem do app."""
+    planilha = planilha_sintetica(n_membros, seed=seed)
+    todas_abas = carregar_todas_abas(planilha)
+    brutas = [pd.DataFrame(valores[1:], columns=valores[0]).replace('', np.nan) for valores in planilha.abas.values()]
+
+    # Mesmos dados gravados em cada fonte local (a pasta temporária vive enquanto as etapas existirem)
+    pasta = tempfile.TemporaryDirectory(prefix="benchmark_pcp_")
+    fontes = {}
+    for tipo in FONTES_LOCAIS:
+        caminho = Path(pasta.name) / ("pcp.db" if tipo == "sqlite" else tipo)
+        salvar_fonte_local(planilha.abas, tipo, caminho)
+        fontes[tipo] = abrir_fonte(tipo, caminho)
+    alocacoes = {aba: tabela_alocacoes(df) for aba, df in todas_abas.items()}
+    df = concatenar_abas(todas_abas)
+    intervalos = concatenar_alocacoes(alocacoes)
+    inicio_proj = pd.Timestamp(datetime.today().date())
+
+    disponibilidade = calculo_disponibilidade(df, inicio_proj, intervalos)
+    afinidade = calculo_afinidade(df, "Desenvolvimento")
+    nota_disp = nota_disponibilidade(disponibilidade)
+    pontuacao = pd.DataFrame({"Membro": df["Membro"], "Disponibilidade": disponibilidade, "Nota Disponibilidade": nota_disp,
+                              "Afinidade": afinidade, "Nota Final": afinidade * 0.5 + nota_disp * 0.5})
+    media_disp, media_afin = disponibilidade.mean(), afinidade.mean()
+    indices = indices_filtros(df, intervalos)
+    amostra_gantt = df.iloc[np.linspace(0, len(df) - 1, min(MAX_FIGURAS_GANTT, len(df))).astype(int)]
+
+    def gantt():
+        for k in range(len(amostra_gantt)):
+            figura_gantt_membro(amostra_gantt.iloc[[k]], CORES_PADRAO, intervalos)
+
+    def cards_por_linha():
+        # Laço anterior da página PCP, antes de `html_cards`: ordena o núcleo inteiro e gera um card por linha
+        for _, row in pontuacao.sort_values(by="Nota Final", ascending=False).iterrows():
+            html_card_membro(row, media_disp, media_afin, CORES_PADRAO)
+
+    return len(df), [
+        ("carga (busca + limpeza das abas)", lambda: carregar_todas_abas(planilha)),
+        ("carga (uma aba, primeira tela)", lambda: carregar_todas_abas(planilha, abas=["NTec"])),
+        *[(f"carga (fonte {tipo})", lambda fonte=fonte, pasta=pasta: carregar_todas_abas(fonte))
+          for tipo, fonte in fontes.items()],
+        ("datas: to_datetime por coluna (anterior)", lambda: datas_por_coluna([bruta.copy() for bruta in brutas])),
+        ("converter_datas (cache frio)", lambda: [converter_datas(bruta, cache={}) for bruta in brutas]),
+        ("converter_datas (cache quente)", lambda: [converter_datas(bruta) for bruta in brutas]),
+        ("tabela_alocacoes", lambda: [tabela_alocacoes(aba) for aba in todas_abas.values()]),
+        ("calculo_disponibilidade", lambda: calculo_disponibilidade(df, inicio_proj, intervalos)),
+        ("disponibilidade_semanal (2 meses)", lambda: disponibilidade_semanal(
+            df, inicio_proj, inicio_proj + pd.DateOffset(months=2), intervalos)),
+        ("calculo_afinidade", lambda: calculo_afinidade(df, "Desenvolvimento")),
+        ("varrer_datas_inicio (8 semanas)", lambda: varrer_datas_inicio(
+            df, intervalos, pd.date_range(inicio_proj, periods=56), "Desenvolvimento")),
+        ("calculo_alocacoes", lambda: calculo_alocacoes(df, intervalos)),
+        ("indices_filtros (Base Consolidada)", lambda: indices_filtros(df, intervalos)),
+        ("aplicar_filtros (cargo + alocações)", lambda: aplicar_filtros(indices, cargo="Analista", alocacoes=1)),
+        (f"figura_gantt_membro (x{len(amostra_gantt)})", gantt),
+        (f"figura_gantt_equipe ({min(MAX_MEMBROS_GANTT_EQUIPE, len(df))} membros)", lambda: figura_gantt_equipe(
+            df.iloc[:MAX_MEMBROS_GANTT_EQUIPE], CORES_PADRAO, intervalos)),
+        ("sensibilidade_pesos (41 pesos)", lambda: sensibilidade_pesos(pontuacao)),
+        ("html_card_membro por linha (anterior)", cards_por_linha),
+        ("html_cards (ranking inteiro, um bloco)", lambda: html_cards(
+            pontuacao.sort_values(by="Nota Final", ascending=False), media_disp, media_afin, CORES_PADRAO)),
+        (f"html_cards (top {CARDS_POR_PAGINA}, página PCP)", lambda: html_cards(
+            pontuacao.nlargest(CARDS_POR_PAGINA, "Nota Final"), media_disp, media_afin, CORES_PADRAO)),
+    ]
+
+def versao_codigo():
+    """Commit atual do repositório, para identificar a execução."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def executar(tamanhos, repeticoes, seed=0):
+    resultados = []
+    for n_membros in tamanhos:
+        linhas, lista_etapas = etapas(n_membros, seed)
+        for nome, funcao in lista_etapas:
+            melhor, mediana, pico = medir(funcao, repeticoes)
+            resultados.append({"membros": n_membros, "linhas": linhas, "etapa": nome,
+                               "melhor_s": melhor, "mediana_s": mediana, "pico_mib": pico})
+            logging.info(f"{n_membros:>7} membros | {nome:<40} | {melhor * 1000:10.2f} ms | {pico:8.2f} MiB")
+    return resultados
+
+def ultimo_resultado(diretorio):
+    arquivos = sorted(Path(diretorio).glob("benchmark-*.json"))
+    return arquivos[-1] if arquivos else None
+
+def comparar(resultados, arquivo_anterior, limiar):
+    """Compara com uma execução anterior e lista as etapas que ficaram mais lentas que o limiar."""
+    anterior = json.loads(Path(arquivo_anterior).read_text(encoding="utf-8"))
+    referencia = {(r["membros"], r["etapa"]): r for r in anterior["resultados"]}
+    regressoes = []
+    for r in resultados:
+        antes = referencia.get((r["membros"], r["etapa"]))
+        if antes is None or antes["melhor_s"] <= 0:
+            continue
+        razao = r["melhor_s"] / antes["melhor_s"]
+        if razao > limiar:
+            regressoes.append((r["membros"], r["etapa"], razao))
+            logging.warning(f"Regressão: {r['etapa']} com {r['membros']} membros ficou {razao:.2f}x mais lenta")
+    if not regressoes:
+        logging.info(f"Nenhuma etapa acima de {limiar:.2f}x em relação a {arquivo_anterior}")
+    return regressoes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede tempo e memória das etapas do PCP com dados sintéticos.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS_PADRAO, help="Quantidades de membros")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--saida", default=str(DIRETORIO_RESULTADOS), help="Diretório dos resultados (JSON)")
+    parser.add_argument("--comparar", help="Resultado anterior para comparação (padrão: o mais recente em --saida)")
+    parser.add_argument("--limiar", type=float, default=1.25, help="Razão de tempo a partir da qual há regressão")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    anterior = args.comparar or ultimo_resultado(args.saida)
+    resultados = executar(args.tamanhos, args.repeticoes, args.seed)
+
+    saida = Path(args.saida)
+    saida.mkdir(parents=True, exist_ok=True)
+    arquivo = saida / f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json"
+    arquivo.write_text(json.dumps({
+        "data": datetime.now().isoformat(), "commit": versao_codigo(), "python": platform.python_version(),
+        "pandas": pd.__version__, "numpy": np.__version__, "repeticoes": args.repeticoes, "resultados": resultados,
+    }, indent=2, ensure_ascii=False), encoding="utf-8")
+    logging.info(f"Resultados salvos em {arquivo}")
+
+    if anterior:
+        comparar(resultados, anterior, args.limiar)
+
+
+if __name__ == "__main__":
+    main()
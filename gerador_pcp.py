@@ -0,0 +1,112 @@
+# ==============================================================================
+# GERADOR DE PLANILHAS SINTÉTICAS DO PCP
+# ==============================================================================
+# Gera abas com o mesmo conjunto de colunas da planilha "PCP Auto" (DATE_COLUMNS,
+# Projeto 1..4, Projeto Interno 1..3, satisfação/validação e cargos excluídos),
+# no formato devolvido por get_all_values: cabeçalho + linhas de texto.
+# Serve para benchmarks e testes de carga, de 50 a 100 mil membros, em memória
+# (PlanilhaFalsa) ou gravada em uma fonte local (CSV, Parquet ou SQLite).
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from motor_pcp import ABAS_NUCLEOS, CARGOS_EXCLUIDOS, PORTFOLIOS, PlanilhaFalsa, salvar_fonte_local
+
+NOMES = ["ana", "bruno", "carla", "diego", "eduarda", "felipe", "gabriela", "henrique", "isabela", "joao",
+         "larissa", "marcos", "natalia", "otavio", "paula", "rafael", "sofia", "thiago", "vitoria", "yuri"]
+SOBRENOMES = ["silva", "souza", "oliveira", "santos", "lima", "pereira", "costa", "almeida", "rocha", "barbosa"]
+CARGOS = ["Analista", "Analista", "Analista", "Analista", "Analista Sênior", "SDR", "Hunter",
+          "Liderança de Chapter", "Product Manager", "Consultor Comercial"]
+SENTIMENTOS = ["Subalocado", "Estou satisfeito", "Superalocado", " estou satisfeito ", "SUBALOCADO"]
+PROJETOS_INTERNOS = ["Processos Internos", "Conteúdo", "Eventos", "Qualidade", "Capacitação", "Marketing"]
+
+PROPORCAO_EXCLUIDOS = 0.05  # Fração de linhas com cargos de CARGOS_EXCLUIDOS
+PROPORCAO_SEM_NOME = 0.02  # Linhas em branco no meio da aba, descartadas na carga
+
+
+def _escolher_texto(rng, opcoes, n, vazio=0.0):
+    """Sorteia n valores de `opcoes`, deixando a fração `vazio` em branco."""
+    valores = np.asarray(opcoes, dtype=object)[rng.integers(0, len(opcoes), n)]
+    valores[rng.random(n) < vazio] = ""
+    return valores
+
+def _formatar_datas(datas, preenchidas):
+    """Formata as datas como DD/MM/AAAA, com texto vazio onde `preenchidas` for falso."""
+    unicas, inverso = np.unique(datas, return_inverse=True)
+    textos = pd.DatetimeIndex(unicas).strftime("%d/%m/%Y").to_numpy(dtype=object)[inverso]
+    textos[~preenchidas] = ""
+    return textos
+
+def gerar_aba(n, nucleo, rng, hoje=None):
+    """Gera os valores brutos de uma aba com n linhas, como devolvidos por `get_all_values`."""
+    hoje = pd.Timestamp(hoje or datetime.today()).normalize()
+    colunas = {}
+
+    indices = np.arange(n)
+    nomes = _escolher_texto(rng, NOMES, n)
+    sobrenomes = _escolher_texto(rng, SOBRENOMES, n)
+    colunas["Membro"] = np.array([f"{nome}.{sobrenome}{i}" for nome, sobrenome, i in zip(nomes, sobrenomes, indices)], dtype=object)
+    colunas["Membro"][rng.random(n) < PROPORCAO_SEM_NOME] = ""
+
+    cargos = _escolher_texto(rng, CARGOS, n)
+    excluidos = rng.random(n) < PROPORCAO_EXCLUIDOS
+    cargos[excluidos] = _escolher_texto(rng, CARGOS_EXCLUIDOS, int(excluidos.sum()))
+    colunas["Cargo no núcleo"] = cargos
+
+    colunas["N° Aprendizagens"] = _escolher_texto(rng, ["0", "0", "1", "1", "2"], n, vazio=0.2)
+    colunas["N° Assessorias"] = _escolher_texto(rng, ["0", "0", "0", "1"], n, vazio=0.2)
+    colunas["Cargo WI"] = _escolher_texto(rng, ["Assessor", "Diretor"], n, vazio=0.9)
+    colunas["Cargo MKT"] = _escolher_texto(rng, ["Redator", "Designer"], n, vazio=0.9)
+    colunas["Saúde mental na PJ"] = _escolher_texto(rng, [str(v) for v in range(1, 11)], n, vazio=0.1)
+    colunas["Como se sente em relação à carga"] = _escolher_texto(rng, SENTIMENTOS, n, vazio=0.1)
+    for portfolio in PORTFOLIOS.get(nucleo, []):
+        colunas[f"Satisfação com o Portfólio: {portfolio}"] = _escolher_texto(rng, ["1", "2", "3", "4", "5"], n, vazio=0.15)
+
+    # --- Projetos externos: cada membro ocupa os primeiros k slots ---
+    qtd_projetos = rng.choice(5, size=n, p=[0.25, 0.3, 0.25, 0.15, 0.05])
+    nomes_projetos = [f"{nucleo}-{codigo:04d}" for codigo in range(max(1, n // 3))]
+    for i in range(1, 5):
+        ativo = qtd_projetos >= i
+        # Projetos começam em semanas fechadas: poucas datas distintas, como na planilha real
+        inicio_previsto = hoje + pd.to_timedelta(rng.integers(-26, 9, n) * 7, unit="D")
+        inicio_real = inicio_previsto + pd.to_timedelta(rng.integers(0, 15, n), unit="D")
+        fim_previsto = inicio_previsto + pd.to_timedelta(rng.integers(30, 181, n), unit="D")
+        fim_estimado = fim_previsto + pd.to_timedelta(rng.integers(0, 31, n), unit="D")
+
+        colunas[f"Projeto {i}"] = np.where(ativo, _escolher_texto(rng, nomes_projetos, n), "").astype(object)
+        colunas[f"Início previsto Projeto {i}"] = _formatar_datas(inicio_previsto, ativo)
+        colunas[f"Início Real Projeto {i}"] = _formatar_datas(inicio_real, ativo & (rng.random(n) > 0.1))
+        colunas[f"Fim previsto do Projeto {i} (sem atraso)"] = _formatar_datas(fim_previsto, ativo & (rng.random(n) > 0.05))
+        colunas[f"Fim estimado do Projeto {i} (com atraso)"] = _formatar_datas(fim_estimado, ativo & (rng.random(n) > 0.4))
+        colunas[f"Validação média do Projeto {i}"] = np.where(
+            ativo, _escolher_texto(rng, ["3", "3.5", "4", "4.5", "5"], n, vazio=0.3), "").astype(object)
+
+    # --- Projetos internos ---
+    qtd_internos = rng.choice(4, size=n, p=[0.5, 0.3, 0.15, 0.05])
+    for i in range(1, 4):
+        ativo = qtd_internos >= i
+        inicio = hoje + pd.to_timedelta(rng.integers(-120, 30, n), unit="D")
+        fim = inicio + pd.to_timedelta(rng.integers(30, 121, n), unit="D")
+        colunas[f"Projeto Interno {i}"] = np.where(ativo, _escolher_texto(rng, PROJETOS_INTERNOS, n), "").astype(object)
+        colunas[f"Início do Projeto Interno {i}"] = _formatar_datas(inicio, ativo)
+        colunas[f"Fim do Projeto Interno {i}"] = _formatar_datas(fim, ativo & (rng.random(n) > 0.1))
+
+    cabecalho = list(colunas)
+    linhas = np.column_stack([colunas[col] for col in cabecalho]).tolist() if n else []
+    return [cabecalho] + linhas
+
+def gerar_planilha(n_membros, seed=0, hoje=None):
+    """Gera as cinco abas do PCP, dividindo `n_membros` entre os núcleos."""
+    rng = np.random.default_rng(seed)
+    tamanhos = np.diff(np.linspace(0, n_membros, len(ABAS_NUCLEOS) + 1).round().astype(int))
+    return {aba: gerar_aba(int(tamanho), aba, rng, hoje) for aba, tamanho in zip(ABAS_NUCLEOS, tamanhos)}
+
+def planilha_sintetica(n_membros, seed=0, latencia=0.0, hoje=None):
+    """Planilha falsa (sem rede) preenchida com dados sintéticos."""
+    return PlanilhaFalsa(gerar_planilha(n_membros, seed, hoje), latencia=latencia)
+
+def salvar_planilha_sintetica(n_membros, tipo, caminho, seed=0, hoje=None):
+    """Grava uma planilha sintética em uma fonte local ("csv", "parquet" ou "sqlite"), para testes de carga."""
+    salvar_fonte_local(gerar_planilha(n_membros, seed, hoje), tipo, caminho)
@@ -0,0 +1,1611 @@
+# ==============================================================================
+# MOTOR DO PCP: CARGA, LIMPEZA E CÁLCULO DAS NOTAS (SEM STREAMLIT)
+# ==============================================================================
+# Importável sem iniciar o Streamlit: usado pela interface (pcp.py), pelo
+# processamento em lote (pcp_lote.py), por notebooks e por workers.
+
+import bisect
+import csv
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import string
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import repeat
+from pathlib import Path
+
+import gspread
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from oauth2client.service_account import ServiceAccountCredentials
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+# ==============================================================================
+# 1. CONSTANTES
+# ==============================================================================
+
+CARGOS_EXCLUIDOS = [
+    "Liderança de Outbound", "Coordenador de Negócios", "Coordenador de Inovação Comercial",
+    "Gerente Comercial", "Coordenador de Projetos", "Coordenador de Inovação de Projetos",
+    "Gerente de Projetos",
+]
+
+DATE_COLUMNS = [
+    "Início previsto Projeto 1", "Início Real Projeto 1", "Fim previsto do Projeto 1 (sem atraso)", "Fim estimado do Projeto 1 (com atraso)",
+    "Início previsto Projeto 2", "Início Real Projeto 2", "Fim previsto do Projeto 2 (sem atraso)", "Fim estimado do Projeto 2 (com atraso)",
+    "Início previsto Projeto 3", "Início Real Projeto 3", "Fim previsto do Projeto 3 (sem atraso)", "Fim estimado do Projeto 3 (com atraso)",
+    "Início previsto Projeto 4", "Início Real Projeto 4", "Fim previsto do Projeto 4 (sem atraso)", "Fim estimado do Projeto 4 (com atraso)",
+    "Início do Projeto Interno 1", "Fim do Projeto Interno 1", "Início do Projeto Interno 2", "Fim do Projeto Interno 2",
+    "Início do Projeto Interno 3", "Fim do Projeto Interno 3",
+]
+
+# --- Schema das abas (aplicado uma vez por versão dos dados) ---
+VERSAO_SCHEMA = 4  # Incrementar ao mudar o schema, para invalidar snapshots antigos
+COLUNAS_NUMERICAS = ["N° Aprendizagens", "N° Assessorias", "Saúde mental na PJ"]
+PREFIXOS_NUMERICOS = ["Satisfação com o Portfólio: ", "Validação média do Projeto "]
+COLUNAS_CATEGORICAS = ["Cargo no núcleo", "Como se sente em relação à carga"]
+LIMIAR_CATEGORIA = 0.5  # Textos com até esta fração de valores distintos (entre os preenchidos) viram categoria
+try:
+    TEXTO_COMPACTO = pd.StringDtype("pyarrow", na_value=np.nan)  # O "str" padrão do pandas 3 (NaN nos vazios)
+except TypeError:
+    TEXTO_COMPACTO = pd.StringDtype("pyarrow_numpy")  # Mesmo tipo no pandas 2.1 e 2.2
+
+ABAS_NUCLEOS = ["NDados", "NTec", "NCiv", "NI", "NCon"]
+TODOS_NUCLEOS = "Todos"  # Modo que junta todas as abas em um único ranking
+MAX_WORKERS = 5  # Limite de threads para busca e limpeza das abas
+FORMATO_DATA = "%d/%m/%Y"
+MAX_DATAS_EM_CACHE = 100_000  # Textos de data já convertidos, lembrados entre as cargas
+CARDS_POR_PAGINA = 20  # Cards exibidos por vez na página PCP ("Carregar mais" mostra os seguintes)
+MAX_MEMBROS_GANTT_EQUIPE = 500  # Membros desenhados na linha do tempo da equipe (os primeiros da tabela filtrada)
+PESOS_DISPONIBILIDADE = np.round(np.arange(0.30, 0.705, 0.01), 2)  # Faixa dos pesos na página PCP (a afinidade fica com 1 - peso)
+HORAS_POR_PROJETO = 10  # Horas semanais que um projeto externo ocupa (mesmo desconto de calculo_disponibilidade)
+DIRETORIO_SNAPSHOT = Path(".pcp_cache")  # Snapshot local (Arrow IPC) das abas processadas
+ARQUIVO_HISTORICO = DIRETORIO_SNAPSHOT / "historico.sqlite"  # Métricas de cada membro a cada carga
+INTERVALO_HISTORICO = pd.Timedelta(days=1)  # Aba sem alterações ganha um novo registro no histórico após este intervalo
+METRICAS_HISTORICO = {  # Coluna do histórico → rótulo exibido
+    "disponibilidade": "Disponibilidade (h/semana)",
+    "alocacoes": "Alocações",
+    "saude_mental": "Saúde mental na PJ"}
+ESCOPO_GOOGLE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+NOME_PLANILHA = "PCP Auto"  # Usado quando a chave (ID) da planilha não é informada
+TIPOS_FONTE = ["sheets", "csv", "parquet", "sqlite"]  # Fontes aceitas por `abrir_fonte`
+
+# --- Retentativas nas chamadas ao Google (cota e instabilidade) ---
+CODIGOS_RETENTATIVA = {429, 500, 502, 503, 504}
+MAX_TENTATIVAS = 5
+ESPERA_BASE_S = 1.0  # Recuo exponencial: até 1s, 2s, 4s... com jitter
+ESPERA_MAXIMA_S = 30.0
+
+# --- Métricas de desempenho (histogramas por etapa, exportados no formato de texto do Prometheus) ---
+LIMITES_HISTOGRAMA_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PORTFOLIOS = { #rever portfolios
+    "NCiv": ["Completo", "Design de Interiores", "HEE", "Sondagem"],
+    "NCon": ["Gestão de Processos", "Pesquisa de Mercado", "Planejamento Estratégico"],
+    "NDados": ["Ciência de Dados", "Engenharia de Dados", "Inteligência Artificial", "Inteligência de Negócios", "DSaaS"],
+    "NI": ["Inovacamp", "VBaaS", "Quick Inovation"],
+    "NTec": ["Product Discovery", "Desenvolvimento", "Escopo Aberto"]}
+
+# ==============================================================================
+# 2. CARREGAMENTO E LIMPEZA DOS DADOS
+# ==============================================================================
+
+class PlanilhaFalsa:
+    """Cliente local que imita a planilha do gspread, para medir e testar o carregamento sem rede.
+
+    `erros_cota` faz as primeiras leituras em lote falharem com erro 429, como na cota da API.
+    """
+
+    class _AbaFalsa:
+        def __init__(self, valores, latencia):
+            self._valores = valores
+            self._latencia = latencia
+
+        def get_all_values(self):
+            time.sleep(self._latencia)
+            return [list(linha) for linha in self._valores]
+
+    class _RespostaCota:
+        status_code = 429
+        text = "Quota exceeded"
+
+        def json(self):
+            return {"error": {"code": 429, "message": self.text, "status": "RESOURCE_EXHAUSTED"}}
+
+    def __init__(self, abas, latencia=0.0, erros_cota=0):
+        self.abas = abas  # {nome_aba: [[cabeçalho...], [linha...], ...]}
+        self.latencia = latencia
+        self.erros_cota = erros_cota
+        self.revisao = 1
+
+    def atualizar_aba(self, nome, valores):
+        """Substitui o conteúdo de uma aba, simulando uma edição na planilha."""
+        self.abas[nome] = valores
+        self.revisao += 1
+
+    def get_lastUpdateTime(self):
+        return str(self.revisao)
+
+    def worksheet(self, nome):
+        if nome not in self.abas:
+            raise gspread.exceptions.WorksheetNotFound(nome)
+        return self._AbaFalsa(self.abas[nome], self.latencia)
+
+    def values_batch_get(self, ranges, params=None):
+        time.sleep(self.latencia)  # Uma única ida e volta para todas as abas
+        if self.erros_cota > 0:
+            self.erros_cota -= 1
+            raise gspread.exceptions.APIError(self._RespostaCota())
+        nomes = [intervalo.strip("'") for intervalo in ranges]
+        faltantes = [nome for nome in nomes if nome not in self.abas]
+        if faltantes:
+            raise gspread.exceptions.WorksheetNotFound(", ".join(faltantes))
+        return {"valueRanges": [{"range": nome, "values": [list(l) for l in self.abas[nome]]} for nome in nomes]}
+
+
+def celulas_texto(df):
+    """Valores de um DataFrame como as células de `get_all_values`: texto, datas em DD/MM/AAAA e vazios como ''."""
+    colunas = []
+    for col in df.columns:
+        serie = df[col]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            serie = serie.dt.strftime(FORMATO_DATA)
+        colunas.append(np.where(serie.isna(), "", serie.astype(str).to_numpy(dtype=object)))
+    linhas = np.column_stack(colunas).tolist() if colunas and len(df) else []
+    return [[str(col) for col in df.columns]] + linhas
+
+class FonteLocal(ABC):
+    """Fonte local que imita a planilha do gspread, para passar pelo mesmo pipeline de limpeza.
+
+    As subclasses leem uma aba como `get_all_values` (cabeçalho + linhas de texto) e gravam as abas
+    nesse mesmo formato. A revisão é uma impressão digital do nome, tamanho e data de modificação de
+    cada arquivo da fonte: muda também quando um arquivo é apagado ou trocado por um mais antigo.
+    """
+
+    extensao = None
+
+    class _Aba:
+        def __init__(self, fonte, nome):
+            self._fonte = fonte
+            self._nome = nome
+
+        def get_all_values(self):
+            return self._fonte.ler_aba(self._nome)
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+
+    def arquivo(self, nome):
+        return self.caminho / f"{nome}.{self.extensao}"
+
+    def arquivos(self):
+        return sorted(self.caminho.glob(f"*.{self.extensao}"))
+
+    @abstractmethod
+    def ler_aba(self, nome):
+        """Valores da aba como `get_all_values`: cabeçalho + linhas de texto."""
+
+    @classmethod
+    @abstractmethod
+    def salvar(cls, valores_abas, caminho):
+        """Grava as abas (nome → valores de `get_all_values`) em `caminho`."""
+
+    def get_lastUpdateTime(self):
+        arquivos = [(arquivo.name, arquivo.stat()) for arquivo in self.arquivos()]
+        return hash_valores([(nome, info.st_size, info.st_mtime_ns) for nome, info in arquivos])
+
+    def worksheet(self, nome):
+        if not self.arquivo(nome).exists():
+            raise gspread.exceptions.WorksheetNotFound(nome)
+        return self._Aba(self, nome)
+
+    def values_batch_get(self, ranges, params=None):
+        nomes = [intervalo.strip("'") for intervalo in ranges]
+        return {"valueRanges": [{"range": nome, "values": self.worksheet(nome).get_all_values()} for nome in nomes]}
+
+class PastaCSV(FonteLocal):
+    """Uma aba por arquivo `<aba>.csv` (UTF-8) na pasta, com o cabeçalho na primeira linha."""
+
+    extensao = "csv"
+
+    def ler_aba(self, nome):
+        with open(self.arquivo(nome), newline="", encoding="utf-8") as arquivo:
+            return list(csv.reader(arquivo))
+
+    @classmethod
+    def salvar(cls, valores_abas, caminho):
+        fonte = cls(caminho)
+        fonte.caminho.mkdir(parents=True, exist_ok=True)
+        for nome, valores in valores_abas.items():
+            with open(fonte.arquivo(nome), "w", newline="", encoding="utf-8") as arquivo:
+                csv.writer(arquivo).writerows(valores)
+
+class PastaParquet(FonteLocal):
+    """Uma aba por arquivo `<aba>.parquet` na pasta; colunas tipadas (datas, números) viram texto na leitura."""
+
+    extensao = "parquet"
+
+    def ler_aba(self, nome):
+        return celulas_texto(pq.read_table(self.arquivo(nome)).to_pandas(date_as_object=False))
+
+    @classmethod
+    def salvar(cls, valores_abas, caminho):
+        fonte = cls(caminho)
+        fonte.caminho.mkdir(parents=True, exist_ok=True)
+        for nome, valores in valores_abas.items():
+            cabecalho, linhas = valores[0], valores[1:]
+            colunas = zip(*(linha + [""] * (len(cabecalho) - len(linha)) for linha in linhas)) if linhas else [[]] * len(cabecalho)
+            tabela = pa.Table.from_arrays([pa.array(list(coluna), pa.string()) for coluna in colunas], names=cabecalho)
+            pq.write_table(tabela, fonte.arquivo(nome))
+
+class BancoSQLite(FonteLocal):
+    """Uma aba por tabela (com o nome da aba) em um banco SQLite; valores tipados viram texto na leitura."""
+
+    def arquivo(self, nome):
+        return self.caminho
+
+    def arquivos(self):
+        # Com journal WAL, as escritas recentes ainda podem estar só no arquivo -wal
+        return [arquivo for arquivo in (self.caminho, Path(f"{self.caminho}-wal")) if arquivo.exists()]
+
+    @staticmethod
+    def _identificador(nome):
+        return '"{}"'.format(nome.replace('"', '""'))
+
+    def _conectar(self):
+        return sqlite3.connect(f"file:{self.caminho}?mode=ro", uri=True, check_same_thread=False)
+
+    def worksheet(self, nome):
+        conexao = self._conectar()
+        try:
+            existe = conexao.execute("SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?", (nome,)).fetchone()
+        finally:
+            conexao.close()
+        if not existe:
+            raise gspread.exceptions.WorksheetNotFound(nome)
+        return self._Aba(self, nome)
+
+    def ler_aba(self, nome):
+        conexao = self._conectar()
+        try:
+            cursor = conexao.execute(f"SELECT * FROM {self._identificador(nome)}")
+            cabecalho = [descricao[0] for descricao in cursor.description]
+            return [cabecalho] + [["" if valor is None else str(valor) for valor in linha] for linha in cursor]
+        finally:
+            conexao.close()
+
+    @classmethod
+    def salvar(cls, valores_abas, caminho):
+        Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+        conexao = sqlite3.connect(caminho)
+        try:
+            with conexao:
+                for nome, valores in valores_abas.items():
+                    cabecalho, linhas = valores[0], valores[1:]
+                    tabela = cls._identificador(nome)
+                    colunas = ", ".join(f"{cls._identificador(col)} TEXT" for col in cabecalho)
+                    conexao.execute(f"DROP TABLE IF EXISTS {tabela}")
+                    conexao.execute(f"CREATE TABLE {tabela} ({colunas})")
+                    conexao.executemany(f"INSERT INTO {tabela} VALUES ({', '.join('?' * len(cabecalho))})",
+                                        (linha + [""] * (len(cabecalho) - len(linha)) for linha in linhas))
+        finally:
+            conexao.close()
+
+FONTES_LOCAIS = {"csv": PastaCSV, "parquet": PastaParquet, "sqlite": BancoSQLite}
+
+def salvar_fonte_local(valores_abas, tipo, caminho):
+    """Grava os valores brutos das abas (como os de `get_all_values`) em uma fonte local do tipo indicado."""
+    FONTES_LOCAIS[tipo].salvar(valores_abas, caminho)
+
+_planilhas_abertas = {}  # (conta de serviço, chave ou nome) → planilha aberta, reaproveitada pelo processo
+_trava_planilhas = threading.Lock()
+_metricas_google = {}  # operação → chamadas, retentativas, falhas e segundos de espera
+_metricas_etapas = {}  # (etapa, aba) → contagem, soma, máximo e contagem por faixa do histograma
+_metricas_cache = {}  # (cache, "acerto" ou "falta") → contagem
+_trava_metricas = threading.Lock()
+_datas_convertidas = {}  # texto da célula → ordinal do dia (int64; NaT para textos inválidos)
+_trava_datas = threading.Lock()
+
+def _registrar_chamada(operacao, **incrementos):
+    with _trava_metricas:
+        contadores = _metricas_google.setdefault(operacao, {"chamadas": 0, "retentativas": 0, "falhas": 0, "espera_s": 0.0})
+        for nome, valor in incrementos.items():
+            contadores[nome] += valor
+
+def metricas_google():
+    """Cópia dos contadores das chamadas ao Google feitas pelo processo, por operação."""
+    with _trava_metricas:
+        return {operacao: dict(contadores) for operacao, contadores in _metricas_google.items()}
+
+@contextmanager
+def medir_etapa(etapa, aba=""):
+    """Mede a duração do trecho e a acumula no histograma da etapa, separado por aba."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        with _trava_metricas:
+            metrica = _metricas_etapas.setdefault((etapa, aba), {
+                "contagem": 0, "soma_s": 0.0, "max_s": 0.0, "faixas": [0] * len(LIMITES_HISTOGRAMA_S)})
+            metrica["contagem"] += 1
+            metrica["soma_s"] += duracao
+            metrica["max_s"] = max(metrica["max_s"], duracao)
+            faixa = bisect.bisect_left(LIMITES_HISTOGRAMA_S, duracao)
+            if faixa < len(LIMITES_HISTOGRAMA_S):
+                metrica["faixas"][faixa] += 1
+
+def registrar_cache(cache, acerto):
+    """Conta um acerto ou uma falta do cache indicado."""
+    chave = (cache, "acerto" if acerto else "falta")
+    with _trava_metricas:
+        _metricas_cache[chave] = _metricas_cache.get(chave, 0) + 1
+
+def metricas_etapas():
+    """Cópia dos histogramas de duração por (etapa, aba) medidos pelo processo."""
+    with _trava_metricas:
+        return {chave: {**metrica, "faixas": list(metrica["faixas"])} for chave, metrica in _metricas_etapas.items()}
+
+def metricas_cache():
+    """Cópia dos contadores de acertos e faltas por (cache, resultado)."""
+    with _trava_metricas:
+        return dict(_metricas_cache)
+
+def _rotulos(**rotulos):
+    """Rótulos no formato do Prometheus, com barras, aspas e quebras de linha escapadas."""
+    def escapar(valor):
+        return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{nome}="{escapar(valor)}"' for nome, valor in rotulos.items()) + "}"
+
+def texto_prometheus():
+    """Métricas do processo no formato de texto do Prometheus (etapas, caches e chamadas ao Google)."""
+    linhas = ["# HELP pcp_etapa_segundos Duração das etapas do PCP.", "# TYPE pcp_etapa_segundos histogram"]
+    for (etapa, aba), metrica in sorted(metricas_etapas().items()):
+        acumulado = 0
+        for limite, contagem in zip(LIMITES_HISTOGRAMA_S, metrica["faixas"]):
+            acumulado += contagem
+            linhas.append(f"pcp_etapa_segundos_bucket{_rotulos(etapa=etapa, aba=aba, le=limite)} {acumulado}")
+        linhas.append(f"pcp_etapa_segundos_bucket{_rotulos(etapa=etapa, aba=aba, le='+Inf')} {metrica['contagem']}")
+        linhas.append(f"pcp_etapa_segundos_sum{_rotulos(etapa=etapa, aba=aba)} {metrica['soma_s']:.6f}")
+        linhas.append(f"pcp_etapa_segundos_count{_rotulos(etapa=etapa, aba=aba)} {metrica['contagem']}")
+
+    linhas += ["# HELP pcp_cache_total Acertos e faltas dos caches do PCP.", "# TYPE pcp_cache_total counter"]
+    for (cache, resultado), contagem in sorted(metricas_cache().items()):
+        linhas.append(f"pcp_cache_total{_rotulos(cache=cache, resultado=resultado)} {contagem}")
+
+    google = metricas_google()
+    for contador, nome, descricao in [("chamadas", "pcp_google_chamadas_total", "Chamadas à API do Google."),
+                                      ("retentativas", "pcp_google_retentativas_total", "Novas tentativas após erros temporários."),
+                                      ("falhas", "pcp_google_falhas_total", "Chamadas que falharam em definitivo."),
+                                      ("espera_s", "pcp_google_espera_segundos_total", "Tempo de espera entre as tentativas.")]:
+        linhas += [f"# HELP {nome} {descricao}", f"# TYPE {nome} counter"]
+        linhas += [f"{nome}{_rotulos(operacao=operacao)} {contadores[contador]}" for operacao, contadores in sorted(google.items())]
+    return "\n".join(linhas) + "\n"
+
+def salvar_prometheus(caminho):
+    """Grava as métricas em um arquivo .prom (coletor de textfile do node_exporter), trocando-o atomicamente."""
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_suffix(".tmp")
+    temporario.write_text(texto_prometheus(), encoding="utf-8")
+    os.replace(temporario, caminho)
+
+def erro_temporario(erro):
+    """Erros de cota (429) e instabilidades do servidor (5xx) merecem uma nova tentativa."""
+    return isinstance(erro, gspread.exceptions.APIError) and erro.code in CODIGOS_RETENTATIVA
+
+def com_retentativas(operacao, funcao, *args, **kwargs):
+    """Executa uma chamada ao Google, repetindo erros temporários com recuo exponencial limitado e jitter."""
+    _registrar_chamada(operacao, chamadas=1)
+    for tentativa in range(1, MAX_TENTATIVAS + 1):
+        try:
+            return funcao(*args, **kwargs)
+        except Exception as e:
+            if tentativa == MAX_TENTATIVAS or not erro_temporario(e):
+                _registrar_chamada(operacao, falhas=1)
+                raise
+            # "Full jitter": espera aleatória até o teto da tentativa, para as sessões não repetirem juntas
+            espera = random.uniform(0, min(ESPERA_MAXIMA_S, ESPERA_BASE_S * 2 ** (tentativa - 1)))
+            logging.warning(f"{operacao}: erro {e.code} do Google; tentativa {tentativa + 1} de {MAX_TENTATIVAS} em {espera:.1f}s.")
+            _registrar_chamada(operacao, retentativas=1, espera_s=espera)
+            time.sleep(espera)
+
+def chamar_fonte(fonte, operacao, funcao, *args, **kwargs):
+    """Chamada à fonte dos dados: só a planilha do Google passa pelas retentativas e pelos contadores do Google."""
+    if isinstance(fonte, FonteLocal):
+        return funcao(*args, **kwargs)
+    return com_retentativas(operacao, funcao, *args, **kwargs)
+
+def buscar_valores_abas(planilha, abas):
+    """Busca os valores brutos de todas as abas: uma requisição em lote, ou em paralelo se o lote falhar."""
+    try:
+        with medir_etapa("busca_lote"):
+            resposta = chamar_fonte(planilha, "values_batch_get", planilha.values_batch_get, [f"'{aba}'" for aba in abas])
+        intervalos = resposta.get("valueRanges", [])
+        return {aba: intervalo.get("values", []) for aba, intervalo in zip(abas, intervalos)}
+    except Exception as e:
+        if erro_temporario(e):
+            # Cota esgotada mesmo após as retentativas: buscar aba por aba só gastaria mais cota
+            logging.error(f"Leitura em lote falhou após {MAX_TENTATIVAS} tentativas: {e}")
+            return dict.fromkeys(abas)
+        logging.warning(f"Leitura em lote falhou, buscando abas em paralelo: {e}")
+
+    def buscar(aba):
+        try:
+            with medir_etapa("get_all_values", aba):
+                return chamar_fonte(planilha, "get_all_values", lambda: planilha.worksheet(aba).get_all_values())
+        except Exception as e:
+            logging.error(f"Erro ao buscar aba '{aba}': {e}", exc_info=True)
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(abas))) as executor:
+        return dict(zip(abas, executor.map(buscar, abas)))
+
+def cabecalhos_unicos(headers):
+    """Numera os cabeçalhos repetidos como o `read_csv` do pandas ("", ".1", ".2"...), para que cada coluna
+    tenha um nome próprio nas etapas seguintes e no snapshot (o Arrow não aceita nomes repetidos)."""
+    originais = set(headers)
+    usados = set()
+    contagens = {}
+    unicos = []
+    for header in headers:
+        nome = header
+        if nome in usados:
+            # Pula os sufixos que já existem na planilha ou já foram usados
+            while nome in usados or nome in originais:
+                contagens[header] = contagens.get(header, 0) + 1
+                nome = f"{header}.{contagens[header]}"
+        usados.add(nome)
+        unicos.append(nome)
+    return unicos
+
+def processar_aba(data, compactar=True):
+    """Converte os valores brutos de uma aba em DataFrame limpo e tipado (e compactado, ver `compactar_aba`)."""
+    if not data:
+        return pd.DataFrame()
+
+    headers = cabecalhos_unicos(data[0])
+    # A leitura em lote omite células vazias no fim das linhas; completa até o tamanho do cabeçalho
+    values = [linha + [''] * (len(headers) - len(linha)) if len(linha) < len(headers) else linha[:len(headers)] for linha in data[1:]]
+
+    pcp_df = pd.DataFrame(values, columns=headers)
+    pcp_df.replace('', np.nan, inplace=True)
+
+    # Limpeza primária dos dados
+    if 'Membro' in pcp_df.columns:
+        pcp_df.dropna(subset=['Membro'], inplace=True)
+    if "Cargo no núcleo" in pcp_df.columns:
+        pcp_df = pcp_df[~pcp_df["Cargo no núcleo"].isin(CARGOS_EXCLUIDOS)]
+
+    # Conversão de tipos de dados (Datas e Números)
+    pcp_df = converter_datas(pcp_df)
+
+    pcp_df = aplicar_schema(pcp_df.reset_index(drop=True))
+    return compactar_aba(pcp_df) if compactar else pcp_df
+
+def converter_datas(pcp_df, colunas=DATE_COLUMNS, cache=None):
+    """Converte todas as colunas de data de uma vez, lendo cada texto distinto uma única vez.
+
+    Cada coluna é fatorada nos seus textos distintos; os que ainda não estão no `cache` (por padrão, o
+    do processo, que dura entre as cargas) são lidos juntos, em uma única chamada a `pd.to_datetime`.
+    Os ordinais de dia (int64) voltam às colunas por indexação. Vazios, textos inválidos e datas fora
+    da faixa de datetime64[ns] viram NaT, como na conversão coluna a coluna com errors='coerce'.
+    As abas são processadas em paralelo: cada chamada consulta o cache uma única vez, sob a trava, e lê
+    das suas próprias datas, então um `clear` feito por outra aba não a afeta.
+    """
+    cache = _datas_convertidas if cache is None else cache
+    fatorados = {col: pd.factorize(pcp_df[col]) for col in colunas if col in pcp_df.columns}
+    if not fatorados:
+        return pcp_df
+
+    distintos = {texto for _, textos in fatorados.values() for texto in textos}
+    with _trava_datas:
+        conhecidas = {texto: cache[texto] for texto in distintos if texto in cache}
+    novos = list(distintos.difference(conhecidas))
+    if novos:
+        lidas = pd.to_datetime(pd.Series(novos, dtype=object), format=FORMATO_DATA, errors="coerce")
+        dias = lidas.to_numpy(dtype="datetime64[D]").astype("int64")
+        fora_da_faixa = (dias < pd.Timestamp.min.ceil("D").value // 86_400_000_000_000) | (
+            dias > pd.Timestamp.max.floor("D").value // 86_400_000_000_000)
+        dias[fora_da_faixa] = np.iinfo("int64").min  # NaT
+        conhecidas.update(zip(novos, dias.tolist()))
+        with _trava_datas:
+            if len(cache) + len(novos) > MAX_DATAS_EM_CACHE:
+                cache.clear()
+            cache.update(zip(novos, dias.tolist()))
+
+    datas = {}
+    for col, (codigos, textos) in fatorados.items():
+        # O último ordinal é o NaT das células vazias (código -1 na fatoração)
+        ordinais = np.fromiter((conhecidas[texto] for texto in textos), dtype="int64", count=len(textos))
+        ordinais = np.append(ordinais, np.iinfo("int64").min)
+        datas[col] = ordinais[codigos].view("datetime64[D]").astype("datetime64[ns]")
+    return pcp_df.assign(**datas)
+
+def aplicar_schema(pcp_df):
+    """Fixa os tipos numéricos e categóricos das colunas usadas no cálculo das notas."""
+    colunas_numericas = [col for col in pcp_df.columns
+                         if col in COLUNAS_NUMERICAS or col.startswith(tuple(PREFIXOS_NUMERICOS))]
+    for col in colunas_numericas:
+        pcp_df[col] = pd.to_numeric(pcp_df[col], errors='coerce').astype(float)
+
+    # Textos de resposta fechada viram categorias; a normalização passa a custar O(categorias)
+    for col in COLUNAS_CATEGORICAS:
+        if col in pcp_df.columns:
+            pcp_df[col] = pcp_df[col].astype("category")
+
+    return pcp_df
+
+def compactar_aba(pcp_df):
+    """Reduz a memória da aba processada, sem mudar os valores usados no cálculo das notas.
+
+    Descarta as colunas vazias (uma vez, na carga), transforma textos repetitivos (nomes de projetos,
+    cargos) em categorias, guarda os demais textos em Arrow, em vez de objetos Python, e passa para
+    float32 as colunas numéricas que cabem nele sem perda.
+    """
+    pcp_df = pcp_df.dropna(axis=1, how="all")
+    # Por posição: a planilha pode repetir cabeçalhos (colunas auxiliares sem nome, por exemplo)
+    colunas = []
+    for _, serie in pcp_df.items():
+        if pd.api.types.is_float_dtype(serie) and serie.dtype.itemsize > 4:
+            reduzida = serie.astype("float32")
+            if reduzida.astype(serie.dtype).equals(serie):
+                serie = reduzida
+        elif pd.api.types.is_string_dtype(serie.dtype):
+            preenchidas = serie.count()
+            if preenchidas and serie.nunique() <= LIMIAR_CATEGORIA * preenchidas:
+                serie = serie.astype("category")
+            elif serie.dtype != TEXTO_COMPACTO:
+                serie = serie.astype(TEXTO_COMPACTO)
+        colunas.append(serie)
+    return pd.concat(colunas, axis=1) if colunas else pcp_df
+
+def bytes_aba(pcp_df):
+    """Memória ocupada pela aba, incluindo o conteúdo dos textos."""
+    return int(pcp_df.memory_usage(index=True, deep=True).sum())
+
+def tabela_alocacoes(pcp_df):
+    """Converte as colunas largas Projeto 1..4 / Projeto Interno 1..3 em uma tabela longa de alocações.
+
+    Uma linha por alocação (membro, tipo, slot, nome, início, fim), indexada pelo rótulo da linha
+    do membro no DataFrame da aba. Para projetos externos o fim é o estimado (com atraso) ou, na
+    falta dele, o previsto. Slots cujo nome está vazio em toda a aba são ignorados, como acontece
+    com as colunas vazias descartadas em `compactar_aba`.
+    """
+    vazio = pd.Series(pd.NaT, index=pcp_df.index, dtype="datetime64[ns]")
+    partes = []
+
+    def coluna(nome_coluna, padrao):
+        return pcp_df[nome_coluna] if nome_coluna in pcp_df.columns else padrao
+
+    for i in range(1, 5):
+        col_projeto = f"Projeto {i}"
+        if col_projeto not in pcp_df.columns or pcp_df[col_projeto].isna().all():
+            continue
+        fim = coluna(f"Fim estimado do Projeto {i} (com atraso)", vazio).fillna(coluna(f"Fim previsto do Projeto {i} (sem atraso)", vazio))
+        partes.append(pd.DataFrame({"tipo": "externo", "slot": i, "nome": pcp_df[col_projeto],
+                                    "inicio": coluna(f"Início Real Projeto {i}", vazio), "fim": fim}))
+
+    for i in range(1, 4):
+        partes.append(pd.DataFrame({"tipo": "interno", "slot": i,
+                                    "nome": coluna(f"Projeto Interno {i}", pd.Series(np.nan, index=pcp_df.index, dtype=object)),
+                                    "inicio": coluna(f"Início do Projeto Interno {i}", vazio),
+                                    "fim": coluna(f"Fim do Projeto Interno {i}", vazio)}))
+
+    tabela = pd.concat(partes) if partes else pd.DataFrame(columns=["tipo", "slot", "nome", "inicio", "fim"])
+    tabela = tabela[tabela["nome"].notna() | tabela["inicio"].notna() | tabela["fim"].notna()]
+    tabela = tabela.astype({"tipo": pd.CategoricalDtype(["externo", "interno"]), "slot": "int8",
+                            "inicio": "datetime64[ns]", "fim": "datetime64[ns]"})
+    tabela.index.name = "linha"
+    return tabela.sort_index(kind="stable")
+
+def novo_estado_carga(diretorio=None, historico=None, fonte="sheets"):
+    """Estado da última carga: revisão da planilha, hash bruto e DataFrame processado de cada aba.
+
+    A revisão é guardada por aba, pois as abas podem ser carregadas separadamente e em momentos diferentes.
+    `verificado_em` guarda quando cada aba foi conferida com a fonte pela última vez, `bytes_abas` a memória
+    de cada aba antes e depois de `compactar_aba` e `versao` é incrementada por quem publica dados novos
+    (a interface), para as sessões saberem que mudou algo. Com `historico` (arquivo SQLite), cada carga
+    bem-sucedida é registrada em `registrar_historico`. `fonte` (ver `identificador_fonte`) vai para o
+    manifesto do snapshot, que só é reaproveitado pela mesma fonte.
+    """
+    return {"lock": threading.Lock(), "revisoes": {}, "hashes": {}, "abas": {}, "verificado_em": {},
+            "bytes_abas": {}, "versao": 0, "diretorio": diretorio, "historico": historico, "fonte": fonte,
+            "origem": "fonte"}
+
+def identificador_fonte(tipo="sheets", caminho=None):
+    """Identifica a fonte dos dados: "sheets" para a planilha ou o tipo e o caminho absoluto da fonte local."""
+    return tipo if tipo == "sheets" else f"{tipo}:{Path(caminho).resolve()}"
+
+def diretorio_snapshot(tipo="sheets", caminho=None):
+    """Diretório do snapshot de cada fonte: o da planilha é DIRETORIO_SNAPSHOT; cada fonte local tem o seu,
+    dentro dele, para nunca sobrescrever os dados que a interface serve no início a frio."""
+    if tipo == "sheets":
+        return DIRETORIO_SNAPSHOT
+    digest = hashlib.blake2b(identificador_fonte(tipo, caminho).encode("utf-8"), digest_size=6).hexdigest()
+    return DIRETORIO_SNAPSHOT / f"{tipo}-{digest}"
+
+def salvar_snapshot(estado, abas):
+    """Grava as abas indicadas em Arrow IPC (Feather) e atualiza o manifesto com revisão e hashes."""
+    diretorio = estado["diretorio"]
+    diretorio.mkdir(parents=True, exist_ok=True)
+    hashes_salvos = {}
+    for aba in abas:
+        caminho = diretorio / f"{aba}.feather"
+        try:
+            # Grava em arquivo temporário e troca de forma atômica para nunca deixar um snapshot pela metade
+            temporario = caminho.with_suffix(".tmp")
+            estado["abas"][aba].to_feather(temporario, compression="uncompressed")
+            os.replace(temporario, caminho)
+        except Exception as e:
+            logging.warning(f"Não foi possível gravar o snapshot da aba '{aba}': {e}")
+            caminho.unlink(missing_ok=True)
+
+    for aba, hash_aba in estado["hashes"].items():
+        if (diretorio / f"{aba}.feather").exists():
+            hashes_salvos[aba] = hash_aba
+
+    revisoes_salvas = {aba: revisao for aba, revisao in estado["revisoes"].items() if aba in hashes_salvos}
+    manifesto = {"revisoes": revisoes_salvas, "hashes": hashes_salvos, "salvo_em": datetime.now().isoformat(),
+                 "versao_schema": VERSAO_SCHEMA, "fonte": estado["fonte"]}
+    temporario = diretorio / "manifesto.tmp"
+    temporario.write_text(json.dumps(manifesto), encoding="utf-8")
+    os.replace(temporario, diretorio / "manifesto.json")
+
+def carregar_snapshot(estado):
+    """Preenche o estado a partir do snapshot local, se existir. Retorna True se algo foi carregado."""
+    diretorio = estado["diretorio"]
+    try:
+        manifesto = json.loads((diretorio / "manifesto.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    if manifesto.get("versao_schema") != VERSAO_SCHEMA:
+        logging.info("Snapshot local gravado com outro schema; ignorado.")
+        return False
+    if manifesto.get("fonte") != estado["fonte"]:
+        logging.info(f"Snapshot local gravado a partir de outra fonte ({manifesto.get('fonte')}); ignorado.")
+        return False
+
+    salvo_em = datetime.fromisoformat(manifesto["salvo_em"]) if manifesto.get("salvo_em") else None
+    for aba, hash_aba in manifesto.get("hashes", {}).items():
+        try:
+            # memory_map evita uma cópia extra na leitura do arquivo
+            with medir_etapa("snapshot", aba):
+                estado["abas"][aba] = feather.read_table(diretorio / f"{aba}.feather", memory_map=True).to_pandas()
+            estado["hashes"][aba] = hash_aba
+            estado["verificado_em"][aba] = salvo_em
+        except Exception as e:
+            logging.warning(f"Snapshot da aba '{aba}' ignorado: {e}")
+
+    if not estado["abas"]:
+        return False
+    estado["revisoes"] = {aba: revisao for aba, revisao in manifesto.get("revisoes", {}).items() if aba in estado["abas"]}
+    estado["origem"] = "snapshot"
+    logging.info(f"Snapshot local carregado ({manifesto.get('salvo_em')}): {list(estado['abas'])}")
+    return True
+
+def hash_valores(data):
+    """Gera uma impressão digital do conteúdo bruto de uma aba."""
+    return hashlib.blake2b(repr(data).encode("utf-8"), digest_size=16).hexdigest()
+
+def ler_revisao(planilha):
+    """Retorna a data da última modificação da planilha (Drive), ou None se não for possível consultar."""
+    try:
+        with medir_etapa("revisao"):
+            return chamar_fonte(planilha, "get_lastUpdateTime", planilha.get_lastUpdateTime)
+    except Exception as e:
+        logging.warning(f"Não foi possível consultar a revisão da planilha: {e}")
+        return None
+
+def carregar_todas_abas(planilha, abas=ABAS_NUCLEOS, estado=None):
+    """Busca as abas de uma vez e reprocessa, em paralelo, apenas as que mudaram desde a última carga.
+
+    `abas` pode ser um subconjunto (por exemplo, só o núcleo aberto na interface); as demais abas do
+    estado não são tocadas.
+    """
+    if estado is None:
+        estado = novo_estado_carga()
+
+    with estado["lock"]:
+        # --- 1. Revisão da planilha: se nada mudou, nem baixa os valores ---
+        revisao = ler_revisao(planilha)
+        sem_alteracao = revisao is not None and all(estado["revisoes"].get(aba) == revisao for aba in abas)
+        registrar_cache("revisao", sem_alteracao)
+        if sem_alteracao:
+            logging.info("Planilha sem alterações desde a última carga; reaproveitando as abas processadas.")
+            estado["verificado_em"].update(dict.fromkeys(abas, datetime.now()))
+            registrar_carga_historico(estado, abas)
+            return {aba: estado["abas"][aba] for aba in abas}
+
+        # --- 2. Hash do conteúdo bruto: só reprocessa as abas que mudaram ---
+        valores = buscar_valores_abas(planilha, abas)
+        hashes = {aba: hash_valores(valores[aba]) for aba in abas if valores.get(aba) is not None}
+        alteradas = [aba for aba in hashes if aba not in estado["abas"] or estado["hashes"].get(aba) != hashes[aba]]
+        for aba in hashes:
+            registrar_cache("hash_aba", aba not in alteradas)
+
+        def processar(aba):
+            try:
+                with medir_etapa("limpeza", aba):
+                    df = processar_aba(valores[aba], compactar=False)
+                with medir_etapa("compactacao", aba):
+                    compacta = compactar_aba(df)
+                estado["bytes_abas"][aba] = (bytes_aba(df), bytes_aba(compacta))
+                logging.info(f"Aba '{aba}' compactada: {estado['bytes_abas'][aba][0] / 2**20:.1f} MiB → "
+                             f"{estado['bytes_abas'][aba][1] / 2**20:.1f} MiB")
+                return compacta, True
+            except Exception as e:
+                logging.error(f"Erro ao processar aba '{aba}': {e}", exc_info=True)
+                return pd.DataFrame(), False
+
+        # Abas que falharam na busca ou no processamento mantêm a última versão boa e o hash dela (ou ficam vazias)
+        falhas = [aba for aba in abas if aba not in hashes]
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(alteradas)))) as executor:
+            for aba, (df, sucesso) in zip(alteradas, executor.map(processar, alteradas)):
+                if sucesso:
+                    estado["abas"][aba] = df
+                    estado["hashes"][aba] = hashes[aba]
+                else:
+                    falhas.append(aba)
+        for aba in falhas:
+            estado["abas"].setdefault(aba, pd.DataFrame())
+
+        # Só registra a revisão das abas atualizadas, para que as falhas sejam refeitas
+        revisoes_anteriores = dict(estado["revisoes"])
+        for aba in abas:
+            if aba in falhas or revisao is None:
+                estado["revisoes"].pop(aba, None)
+            else:
+                estado["revisoes"][aba] = revisao
+            if aba not in falhas:
+                estado["verificado_em"][aba] = datetime.now()
+        estado["origem"] = "fonte"
+        logging.info(f"Abas reprocessadas: {alteradas or 'nenhuma'}")
+
+        atualizadas = [aba for aba in alteradas if aba not in falhas]
+        if estado["diretorio"] is not None and (atualizadas or estado["revisoes"] != revisoes_anteriores):
+            salvar_snapshot(estado, atualizadas)
+        registrar_carga_historico(estado, [aba for aba in abas if aba not in falhas])
+        return {aba: estado["abas"][aba] for aba in abas}
+
+def abrir_planilha(creds_info, nome=NOME_PLANILHA, chave=None):
+    """Abre a planilha do PCP com a conta de serviço, reaproveitando a conexão já aberta no processo.
+
+    A autenticação e a abertura acontecem uma vez por conta e planilha; o token é renovado pelo
+    próprio cliente. Com `chave` (ID da planilha), abre direto, sem a busca pelo nome no Drive.
+    """
+    identificador = (creds_info.get("client_email"), chave or nome)
+    with _trava_planilhas:
+        registrar_cache("conexao_google", identificador in _planilhas_abertas)
+        if identificador not in _planilhas_abertas:
+            with medir_etapa("autenticacao"):
+                credentials = ServiceAccountCredentials.from_json_keyfile_dict(creds_info, ESCOPO_GOOGLE)
+                client = gspread.authorize(credentials)
+                _planilhas_abertas[identificador] = com_retentativas(
+                    "abrir_planilha", client.open_by_key if chave else client.open, chave or nome)
+        return _planilhas_abertas[identificador]
+
+def abrir_fonte(tipo="sheets", caminho=None, creds_info=None, chave=None, nome=NOME_PLANILHA):
+    """Abre a fonte dos dados do PCP: a planilha do Google ("sheets") ou uma fonte local (csv, parquet, sqlite).
+
+    Todas devolvem os mesmos valores brutos das abas e passam pela mesma limpeza em `carregar_todas_abas`.
+    """
+    if tipo == "sheets":
+        return abrir_planilha(creds_info, nome=nome, chave=chave)
+    if tipo not in FONTES_LOCAIS:
+        raise ValueError(f"Fonte de dados desconhecida: '{tipo}'. Use uma de {TIPOS_FONTE}.")
+    if caminho is None:
+        raise ValueError(f"A fonte '{tipo}' exige o caminho dos dados.")
+    return FONTES_LOCAIS[tipo](caminho)
+
+def nome_aba(nucleo):
+    """Corrige a grafia do núcleo para o nome da aba na planilha."""
+    correção_nucleo = {"nciv": "NCiv", "ncon": "NCon", "ndados": "NDados", "ni": "NI", "ntec": "NTec",
+                       "todos": TODOS_NUCLEOS}
+    return correção_nucleo.get(nucleo.lower(), nucleo)
+
+def concatenar_abas(todas_abas):
+    """Junta todas as abas em um único DataFrame indexado por (Núcleo, linha), com a coluna "Núcleo"."""
+    abas = {aba: df for aba, df in todas_abas.items() if not df.empty}
+    if not abas:
+        return pd.DataFrame()
+
+    df = pd.concat(abas, names=["Núcleo", "linha"])
+    df.insert(0, "Núcleo", pd.Categorical(df.index.get_level_values("Núcleo"), categories=list(abas)))
+    # Categorias diferentes entre as abas viram texto no concat; refaz a categoria com a união delas
+    categoricas = {col for aba in abas.values() for col in aba.select_dtypes("category").columns}
+    return df.assign(**{col: df[col].astype("category") for col in categoricas if col in df.columns})
+
+def concatenar_alocacoes(alocacoes):
+    """Junta as tabelas de alocações das abas, com o mesmo índice (Núcleo, linha) de `concatenar_abas`."""
+    return pd.concat(alocacoes, names=["Núcleo", "linha"])
+
+
+# ==============================================================================
+# 3. CÁLCULO DAS NOTAS
+# ==============================================================================
+
+def somar_por_membro(df, intervalos, valores, mascara=None):
+    """Soma `valores` (um por alocação) por membro, alinhado às linhas de `df`, em uma única passada."""
+    posicoes = df.index.get_indexer(intervalos.index)
+    validos = posicoes >= 0
+    if mascara is not None:
+        validos &= mascara
+    return np.bincount(posicoes[validos], weights=np.asarray(valores, dtype=float)[validos], minlength=len(df))
+
+def categorias_normalizadas(serie, mapa, padrao):
+    """Aplica `mapa` às categorias normalizadas (sem espaços, em maiúsculas) e expande por linha.
+
+    O mapeamento roda sobre as categorias, não sobre as linhas; vazios recebem `padrao`.
+    """
+    categorias = serie.cat.categories.astype(str).str.strip().str.upper()
+    valores = np.append(np.asarray(categorias.map(mapa).fillna(padrao), dtype=float), padrao)
+    return pd.Series(valores[serie.cat.codes.to_numpy()], index=serie.index)  # código -1 (vazio) → padrao
+
+def horas_fixas(df):
+    """Horas semanais de cada membro antes das alocações: 30h menos atividades e cargos especiais."""
+    horas = pd.Series(30.0, index=df.index)
+
+    # --- Descontos por atividades numéricas (Acesso Seguro) ---
+    if "N° Aprendizagens" in df:
+        horas -= df["N° Aprendizagens"].astype(float).fillna(0) * 5
+    if "N° Assessorias" in df:
+        horas -= df["N° Assessorias"].astype(float).fillna(0) * 10
+
+    cargos_especiais = ["SDR", "Hunter", "Analista Sênior", "Liderança de Chapter", "Product Manager"]
+    if "Cargo no núcleo" in df.columns:
+        # Normalização feita sobre as categorias; cargos vazios não recebem desconto
+        is_special_role = categorias_normalizadas(df["Cargo no núcleo"], dict.fromkeys(cargos_especiais, 1.0), 0.0)
+        horas -= is_special_role * 10
+    return horas
+
+def calculo_disponibilidade(df, inicio_novo_projeto, intervalos=None):
+    """ Calcula as horas de disponibilidade para cada membro (versão vetorizada e segura). """
+    horas = horas_fixas(df)
+    inicio_novo_projeto = pd.to_datetime(inicio_novo_projeto) # Garante que a data seja do tipo correto
+    if intervalos is None:
+        intervalos = tabela_alocacoes(df)
+
+    # --- Descontos por alocação (uma passada sobre a tabela longa) ---
+    externo = (intervalos["tipo"] == "externo").to_numpy()
+    tem_fim = intervalos["fim"].notna().to_numpy()
+    dias_restantes = (intervalos["fim"] - inicio_novo_projeto).dt.days.to_numpy()
+
+    desconto = np.where(
+        externo,
+        # Projeto externo: desconto pela data de fim; sem data de fim, desconto cheio
+        np.where(tem_fim, np.select([dias_restantes > 14, dias_restantes > 7], [10, 4], default=1),
+                 np.where(intervalos["nome"].notna().to_numpy(), 10, 0)),
+        # Projeto interno: desconto fixo quando há data de início
+        np.where(intervalos["inicio"].notna().to_numpy(), 5, 0),
+    )
+    horas -= somar_por_membro(df, intervalos, desconto)
+
+    return horas
+
+def disponibilidade_por_data(df, datas, intervalos=None):
+    """`calculo_disponibilidade` para várias datas de início de uma vez: matriz membros × datas.
+
+    As datas de fim das alocações são comparadas com todas as datas em uma única operação.
+    """
+    datas = pd.DatetimeIndex(datas)
+    if intervalos is None:
+        intervalos = tabela_alocacoes(df)
+
+    externo = (intervalos["tipo"] == "externo").to_numpy()
+    tem_fim = intervalos["fim"].notna().to_numpy()
+    fins = intervalos["fim"].fillna(pd.Timestamp(0)).to_numpy(dtype="datetime64[ns]")  # vazios são descartados abaixo
+    dias_restantes = (fins[:, None] - datas.to_numpy()[None, :]) // np.timedelta64(1, "D")  # alocações × datas
+
+    desconto_fim = np.select([dias_restantes > 14, dias_restantes > 7], [10, 4], default=1)
+    sem_fim = np.where(externo, np.where(intervalos["nome"].notna().to_numpy(), 10, 0),
+                       np.where(intervalos["inicio"].notna().to_numpy(), 5, 0))
+    desconto = np.where((externo & tem_fim)[:, None], desconto_fim, sem_fim[:, None])
+
+    # Soma por membro de todas as colunas de uma vez: índice achatado (membro, data)
+    posicoes = df.index.get_indexer(intervalos.index)
+    validos = posicoes >= 0
+    chaves = (posicoes[validos, None] * len(datas) + np.arange(len(datas))[None, :]).ravel()
+    ocupadas = np.bincount(chaves, weights=desconto[validos].ravel(), minlength=len(df) * len(datas))
+
+    return pd.DataFrame(horas_fixas(df).to_numpy()[:, None] - ocupadas.reshape(len(df), len(datas)),
+                        index=df.index, columns=datas)
+
+def disponibilidade_semanal(df, inicio, fim, intervalos=None):
+    """Horas livres de cada membro (linhas) em cada semana de [inicio, fim] (colunas).
+
+    Aplica semana a semana os mesmos descontos de `calculo_disponibilidade`: projeto externo
+    ocupa 10h, 4h nas duas últimas semanas e 1h na última; interno ocupa 5h até o fim.
+    Alocações sem início já estão em andamento; sem fim, seguem além da janela.
+    """
+    inicio = pd.Timestamp(inicio)
+    semanas = pd.date_range(inicio, max(pd.Timestamp(fim), inicio), freq="7D")
+    n_semanas = len(semanas)
+    if intervalos is None:
+        intervalos = tabela_alocacoes(df)
+
+    externo = (intervalos["tipo"] == "externo").to_numpy()
+    tem_fim = intervalos["fim"].notna().to_numpy()
+    tem_inicio = intervalos["inicio"].notna().to_numpy()
+    dias_inicio = (intervalos["inicio"] - inicio).dt.days.to_numpy(dtype=float, na_value=0)
+    dias_fim = (intervalos["fim"] - inicio).dt.days.to_numpy(dtype=float, na_value=0)
+    semana_inicial = np.floor(dias_inicio / 7)
+    ate_o_fim = np.where(tem_fim, np.floor(dias_fim / 7) + 1, n_semanas)  # semanas k com 7k <= dias_fim
+
+    # Cada alocação vira até três trechos de semanas [esquerda, direita) com desconto constante
+    externo_com_fim = externo & tem_fim
+    trechos = [
+        (np.where(externo, np.where(tem_fim | intervalos["nome"].notna().to_numpy(), 10, 0), np.where(tem_inicio, 5, 0)),
+         np.where(externo_com_fim, np.ceil((dias_fim - 14) / 7), ate_o_fim)),
+        (np.where(externo_com_fim, 4, 0), np.ceil((dias_fim - 7) / 7)),
+        (np.where(externo_com_fim, 1, 0), ate_o_fim),
+    ]
+
+    # Varredura: soma o desconto no início de cada trecho, subtrai no fim e acumula ao longo das semanas
+    posicoes = df.index.get_indexer(intervalos.index)
+    largura = n_semanas + 1
+    diferencas = np.zeros(len(df) * largura)
+    esquerda = semana_inicial
+    for desconto, direita in trechos:
+        esq = np.clip(esquerda, 0, n_semanas).astype(int)
+        dir_ = np.clip(direita, 0, n_semanas).astype(int)
+        validos = (posicoes >= 0) & (desconto > 0) & (dir_ > esq)
+        base = posicoes[validos] * largura
+        diferencas += np.bincount(base + esq[validos], weights=desconto[validos], minlength=len(diferencas))
+        diferencas -= np.bincount(base + dir_[validos], weights=desconto[validos], minlength=len(diferencas))
+        esquerda = np.maximum(semana_inicial, direita)
+    ocupadas = np.cumsum(diferencas.reshape(len(df), largura), axis=1)[:, :n_semanas]
+
+    return pd.DataFrame(horas_fixas(df).to_numpy()[:, None] - ocupadas, index=df.index, columns=semanas)
+
+def calculo_disponibilidade_periodo(df, inicio, fim=None, intervalos=None, criterio="minima"):
+    """Horas disponíveis de cada membro durante o projeto.
+
+    Com `fim`, resume a matriz semanal pela semana mais carregada ("minima") ou pela média
+    ("media"); sem `fim`, ou com `criterio=None`, usa só a data de início.
+    """
+    if fim is None or pd.isna(fim) or criterio is None:
+        return calculo_disponibilidade(df, inicio, intervalos)
+    semanal = disponibilidade_semanal(df, inicio, fim, intervalos)
+    return semanal.min(axis=1) if criterio == "minima" else semanal.mean(axis=1)
+
+def calculo_afinidade(df, portfolio):
+    """Calcula a nota de afinidade para cada membro (versão vetorizada e segura)."""
+
+    # --- Critério 1: Satisfação com o Portfólio (Acesso Seguro) ---
+    col_satisfacao = f"Satisfação com o Portfólio: {portfolio}"
+    if col_satisfacao in df:
+        # Se a coluna existir, calcula a satisfação a partir dela
+        satisfacao = df[col_satisfacao].astype(float).fillna(3.0) * 2
+    else:
+        # Se não existir, atribui um valor padrão para todos os membros
+        satisfacao = pd.Series(6.0, index=df.index)  # (Valor padrão 3.0 * 2)
+
+    # --- Critério 2: Capacidade Técnica (Lógica já era segura) ---
+    col_capacidade = [f"Validação média do Projeto {i}" for i in range(1, 5) if f"Validação média do Projeto {i}" in df.columns]
+    if col_capacidade:
+        capacidade = df[col_capacidade].astype(float).mean(axis=1).fillna(3.0) * 2
+    else:
+        # Se nenhuma coluna de validação existir, atribui um valor padrão
+        capacidade = pd.Series(6.0, index=df.index)
+
+    # --- Critério 3: Saúde Mental (Acesso Seguro) ---
+    # Sentimento em relação à carga
+    if "Como se sente em relação à carga" in df:
+        sentimento_map = {"SUBALOCADO": 10, "ESTOU SATISFEITO": 5, "SUPERALOCADO": 1}
+        pontuacao_sentimento = categorias_normalizadas(df["Como se sente em relação à carga"], sentimento_map, 5.0)
+    else:
+        pontuacao_sentimento = pd.Series(5.0, index=df.index)
+        
+    # Saúde mental na PJ
+    if "Saúde mental na PJ" in df:
+        saude_mental = df["Saúde mental na PJ"].astype(float).fillna(5.0)
+    else:
+        saude_mental = pd.Series(5.0, index=df.index)
+
+    saude_mental_final = (pontuacao_sentimento + saude_mental) / 2
+    
+    # --- Cálculo Final da Afinidade ---
+    return (satisfacao + capacidade + saude_mental_final) / 3
+
+def calculo_alocacoes(df, intervalos=None):
+    """Calcula o número total de alocações para cada membro (versão ajustada)."""
+    conta = pd.Series(0, index=df.index, dtype=int)
+    if intervalos is None:
+        intervalos = tabela_alocacoes(df)
+
+    # --- 1. Contagem de projetos externos e internos ---
+    # Um projeto conta como alocação simplesmente se ele existe (tem um nome na célula).
+    conta += somar_por_membro(df, intervalos, intervalos["nome"].notna().to_numpy()).astype(int)
+
+    # --- 2. Contagem de atividades "flag" ---
+    atividades_simples = ["Cargo WI", "Cargo MKT"]
+    for col in atividades_simples:
+        if col in df.columns:
+            conta += df[col].notna().astype(int)
+
+    # --- 3. Soma dos valores de atividades numéricas ---
+    atividades_numericas = ["N° Aprendizagens", "N° Assessorias"]
+    for col in atividades_numericas:
+        if col in df.columns:
+            conta += df[col].fillna(0).astype(int)
+
+    # --- 4. Contagem de cargos específicos (LÓGICA CORRIGIDA) ---
+    if "Cargo no núcleo" in df.columns:
+        # Adiciona 1 se o cargo contiver a palavra "Comercial"
+        eh_comercial = df["Cargo no núcleo"].str.contains("Comercial", case=False, na=False)
+        conta += eh_comercial.astype(int)
+        
+    return conta
+
+def indices_filtros(df, intervalos=None):
+    """Índices dos filtros da Base Consolidada: valor → posições das linhas, montados uma vez por versão dos dados.
+
+    Cobre cargo, membro e número de alocações (0, 1, 2, 3 e 4 para "4 ou mais"), além das opções
+    já ordenadas dos seletores.
+    """
+    posicoes = pd.Series(np.arange(len(df)), index=df.index)
+    contagem = np.minimum(calculo_alocacoes(df, intervalos).to_numpy(), 4)
+    indices = {
+        "membro": posicoes.groupby(df["Membro"].to_numpy()).indices,
+        "alocacoes": posicoes.groupby(contagem).indices,
+        "cargo": {},
+    }
+    if "Cargo no núcleo" in df.columns:
+        indices["cargo"] = posicoes.groupby(df["Cargo no núcleo"], observed=True).indices
+    indices["opcoes_membro"] = sorted(indices["membro"])
+    indices["opcoes_cargo"] = sorted(indices["cargo"])
+    return indices
+
+def aplicar_filtros(indices, cargo=None, membro=None, alocacoes=None):
+    """Posições das linhas que passam em todos os filtros informados, por interseção dos índices.
+
+    Retorna None quando nenhum filtro foi informado (todas as linhas).
+    """
+    vazio = np.empty(0, dtype=np.intp)
+    selecionados = [indices[nome].get(valor, vazio) for nome, valor in
+                    (("cargo", cargo), ("membro", membro), ("alocacoes", alocacoes)) if valor is not None]
+    if not selecionados:
+        return None
+    resultado = selecionados[0]
+    for posicoes in selecionados[1:]:
+        resultado = np.intersect1d(resultado, posicoes, assume_unique=True)
+    return resultado
+
+def nota_disponibilidade(disponibilidade):
+    """Normaliza as horas disponíveis para a escala 0-10 (30h = nota máxima)."""
+    max_disp, min_disp = 30, disponibilidade.min()
+    range_disp = max_disp - min_disp if max_disp > min_disp else 1
+    return 10 * (disponibilidade - min_disp) / range_disp
+
+def pontuar_projeto(df, intervalos, inicio_proj, portfolio, peso_disp=0.5, peso_afin=0.5, fim_proj=None, criterio="minima"):
+    """Calcula disponibilidade, afinidade e nota final de cada membro para um projeto.
+
+    Com `fim_proj`, a disponibilidade considera todo o período do projeto (ver `calculo_disponibilidade_periodo`).
+    """
+    disponibilidade = calculo_disponibilidade_periodo(df, pd.Timestamp(inicio_proj), fim_proj, intervalos, criterio)
+    afinidade = calculo_afinidade(df, portfolio)
+    nota_final = (afinidade * peso_afin) + (nota_disponibilidade(disponibilidade) * peso_disp)
+
+    pontuacao = pd.DataFrame({"Membro": df["Membro"], "Disponibilidade": disponibilidade,
+                              "Afinidade": afinidade, "Nota Final": nota_final})
+    if "Núcleo" in df.columns:
+        pontuacao.insert(0, "Núcleo", df["Núcleo"])
+    return pontuacao
+
+def varrer_datas_inicio(df, intervalos, datas, portfolio, peso_disp=0.5, peso_afin=0.5, membros=None, tamanho_equipe=5):
+    """Avalia o projeto em várias datas de início e devolve a melhor data e a curva de notas.
+
+    A equipe é formada pelos `membros` escolhidos (rótulos de `df`) ou, sem eles, pelos
+    `tamanho_equipe` membros de maior nota em cada data. A melhor data é a de maior
+    disponibilidade média da equipe (a mais cedo, em caso de empate).
+    """
+    disponibilidade = disponibilidade_por_data(df, datas, intervalos).to_numpy()
+    afinidade = calculo_afinidade(df, portfolio).to_numpy()[:, None]
+    # nota_disponibilidade por coluna: o mínimo de cada data define a escala
+    minimo = disponibilidade.min(axis=0, initial=30)
+    escala = np.where(minimo < 30, 30 - minimo, 1)
+    notas = afinidade * peso_afin + 10 * (disponibilidade - minimo) / escala * peso_disp
+
+    if membros is not None and len(membros):
+        linhas = df.index.get_indexer(membros)
+        equipe = np.broadcast_to(linhas[linhas >= 0][:, None], (int((linhas >= 0).sum()), notas.shape[1]))
+    else:
+        k = min(tamanho_equipe, len(df))
+        equipe = np.argpartition(-notas, k - 1, axis=0)[:k] if k else np.empty((0, notas.shape[1]), dtype=int)
+
+    colunas = np.arange(notas.shape[1])
+    curva = pd.DataFrame({
+        "Disponibilidade Média": disponibilidade[equipe, colunas].mean(axis=0) if len(equipe) else np.nan,
+        "Nota Final Média": notas[equipe, colunas].mean(axis=0) if len(equipe) else np.nan,
+    }, index=pd.DatetimeIndex(datas, name="Início"))
+    melhor = curva["Disponibilidade Média"].idxmax() if curva["Disponibilidade Média"].notna().any() else None
+    return melhor, curva
+
+def sensibilidade_pesos(pontuacao, pesos=PESOS_DISPONIBILIDADE, top=5):
+    """Posição de cada membro em toda a faixa de pesos da disponibilidade, em uma única operação.
+
+    Usa a coluna "Nota Disponibilidade" já calculada pela página (na escala do núcleo inteiro), para que a
+    posição no peso atual seja a mesma dos cards mesmo quando `pontuacao` é só uma parte dos membros.
+    Devolve a matriz de posições (membros × pesos, 1 = melhor), a estabilidade de quem passa
+    pelo top em algum peso e os pesos em que o top muda (quem entra e quem sai).
+    """
+    pesos = np.asarray(pesos, dtype=float)
+    nota_disp = pontuacao["Nota Disponibilidade"].to_numpy(dtype=float)[:, None]
+    afinidade = pontuacao["Afinidade"].to_numpy()[:, None]
+    notas = nota_disp * pesos + afinidade * (1 - pesos)  # membros × pesos
+
+    ordem = np.argsort(-notas, axis=0, kind="stable")
+    posicoes = np.empty_like(ordem)
+    np.put_along_axis(posicoes, ordem, np.arange(1, len(notas) + 1)[:, None], axis=0)
+    no_top = posicoes <= top
+
+    nomes = pontuacao["Membro"].to_numpy()
+    linhas = np.flatnonzero(no_top.any(axis=1))
+    estabilidade = pd.DataFrame({
+        "Membro": nomes[linhas], f"No Top {top} (%)": no_top[linhas].mean(axis=1) * 100,
+        "Melhor Posição": posicoes[linhas].min(axis=1), "Pior Posição": posicoes[linhas].max(axis=1),
+    }, index=pontuacao.index[linhas]).sort_values([f"No Top {top} (%)", "Melhor Posição"], ascending=[False, True])
+
+    # Colunas em que o conjunto do top muda em relação ao peso anterior
+    mudancas = np.flatnonzero((no_top[:, 1:] != no_top[:, :-1]).any(axis=0)) + 1
+    trocas = pd.DataFrame({
+        "Peso Disponibilidade": pesos[mudancas],
+        "Entram": [", ".join(nomes[no_top[:, j] & ~no_top[:, j - 1]]) for j in mudancas],
+        "Saem": [", ".join(nomes[~no_top[:, j] & no_top[:, j - 1]]) for j in mudancas],
+    })
+    return pd.DataFrame(posicoes, index=pontuacao.index, columns=pesos), estabilidade, trocas
+
+def resumo_por_nucleo(pontuacao):
+    """Resume o ranking global por núcleo: membros, médias e o melhor colocado de cada um."""
+    # O quadro de `pontuar_projeto` sobre `concatenar_abas` tem o índice (Núcleo, linha): agrupa só pela coluna
+    pontuacao = pontuacao.reset_index(drop=True)
+    melhores = pontuacao.loc[pontuacao.groupby("Núcleo", observed=True)["Nota Final"].idxmax()]
+    resumo = pontuacao.groupby("Núcleo", observed=True).agg(
+        **{"Membros": ("Membro", "size"), "Disponibilidade Média": ("Disponibilidade", "mean"),
+           "Afinidade Média": ("Afinidade", "mean"), "Nota Final Média": ("Nota Final", "mean")})
+    resumo["Melhor Membro"] = melhores.set_index("Núcleo")["Membro"]
+    resumo["Melhor Nota Final"] = melhores.set_index("Núcleo")["Nota Final"]
+    return resumo.sort_values("Melhor Nota Final", ascending=False).reset_index()
+
+def matriz_notas(df, intervalos, projetos, criterio="minima"):
+    """Nota Final de cada membro (linhas) em cada projeto (colunas) de `projetos`.
+
+    A disponibilidade é calculada uma vez por período (início, fim) e a afinidade uma vez por portfólio.
+    """
+    fins = projetos["fim"] if "fim" in projetos else pd.Series(pd.NaT, index=projetos.index)
+    periodos = [(inicio, None if pd.isna(fim) else fim) for inicio, fim in zip(projetos["inicio"], fins)]
+    disponibilidade = {periodo: nota_disponibilidade(calculo_disponibilidade_periodo(df, *periodo, intervalos, criterio))
+                       for periodo in set(periodos)}
+    afinidade = {portfolio: calculo_afinidade(df, portfolio) for portfolio in projetos["portfolio"].drop_duplicates()}
+    colunas = [afinidade[p.portfolio].to_numpy() * p.peso_afin + disponibilidade[periodo].to_numpy() * p.peso_disp
+               for p, periodo in zip(projetos.itertuples(index=False), periodos)]
+    return np.column_stack(colunas) if colunas else np.empty((len(df), 0))
+
+def escalar_projetos(df, intervalos, projetos, horas_por_projeto=HORAS_POR_PROJETO, criterio="minima"):
+    """Distribui membros entre projetos simultâneos maximizando a soma das Notas Finais.
+
+    `projetos` tem as colunas projeto, portfolio, inicio e vagas (e, opcionalmente, fim, nucleo,
+    peso_disp e peso_afin). Cada membro entra em no máximo um lugar por projeto e em tantos
+    projetos quanto cabem nas suas horas restantes (`horas_por_projeto` por projeto), medidas
+    na semana mais carregada do período conjunto; `criterio` vale só para as notas.
+    O problema é de transporte (matriz totalmente unimodular), então a solução é exata.
+    """
+    projetos = projetos.reset_index(drop=True).assign(
+        inicio=lambda p: pd.to_datetime(p["inicio"]),
+        fim=lambda p: pd.to_datetime(p["fim"]) if "fim" in p else pd.NaT,
+        peso_disp=projetos["peso_disp"].to_numpy() if "peso_disp" in projetos else 0.5,
+        peso_afin=projetos["peso_afin"].to_numpy() if "peso_afin" in projetos else 0.5)
+    vagas = projetos["vagas"].astype(int).clip(lower=0).to_numpy()
+
+    # Horas restantes na semana mais carregada do período conjunto: os projetos correm em paralelo
+    fim_conjunto = projetos["fim"].max()
+    disponibilidade = calculo_disponibilidade_periodo(df, projetos["inicio"].min(),
+                                                      None if pd.isna(fim_conjunto) else fim_conjunto, intervalos)
+    capacidade = np.floor(disponibilidade.clip(lower=0).to_numpy() / horas_por_projeto).astype(int)
+
+    notas = matriz_notas(df, intervalos, projetos, criterio)
+    elegivel = np.broadcast_to((capacidade > 0)[:, None], notas.shape).copy()
+    if "nucleo" in projetos and "Núcleo" in df.columns:
+        # No modo "Todos", projetos de um núcleo só recebem membros daquele núcleo
+        nucleo_membro = df["Núcleo"].astype(str).to_numpy()[:, None]
+        nucleo_projeto = projetos["nucleo"].astype(str).to_numpy()[None, :]
+        elegivel &= (nucleo_projeto == TODOS_NUCLEOS) | (nucleo_membro == nucleo_projeto)
+
+    # Só os pares elegíveis viram variáveis: x[m, p] = 1 se o membro m entra no projeto p
+    membros, cols = np.nonzero(elegivel)
+    atribuidos = np.zeros(0, dtype=bool)
+    if len(membros):
+        n = len(membros)
+        por_membro = sparse.csr_matrix((np.ones(n), (membros, np.arange(n))), shape=(len(df), n))
+        por_projeto = sparse.csr_matrix((np.ones(n), (cols, np.arange(n))), shape=(len(projetos), n))
+        resultado = milp(-notas[membros, cols], integrality=np.ones(n), bounds=Bounds(0, 1),
+                         constraints=[LinearConstraint(por_membro, 0, capacidade),
+                                      LinearConstraint(por_projeto, 0, vagas)])
+        if resultado.x is None:
+            raise RuntimeError(f"Otimização da escalação falhou: {resultado.message}")
+        atribuidos = resultado.x > 0.5
+    membros, cols = membros[atribuidos], cols[atribuidos]
+
+    ocupados = np.bincount(cols, minlength=len(projetos))
+    for projeto, faltam in zip(projetos["projeto"], vagas - ocupados):
+        if faltam > 0:
+            logging.warning(f"Projeto '{projeto}': {faltam} vaga(s) sem membro disponível.")
+
+    escalacao = pd.DataFrame({
+        "Projeto": projetos["projeto"].to_numpy()[cols], "Portfólio": projetos["portfolio"].to_numpy()[cols],
+        "Membro": df["Membro"].to_numpy()[membros], "Nota Final": notas[membros, cols],
+        "Horas Restantes": disponibilidade.to_numpy()[membros]
+                           - np.bincount(membros, minlength=len(df))[membros] * horas_por_projeto,
+    }, index=df.index[membros])
+    if "Núcleo" in df.columns:
+        escalacao.insert(2, "Núcleo", df["Núcleo"].to_numpy()[membros])
+    ordem = np.lexsort((-escalacao["Nota Final"].to_numpy(), cols))  # projetos na ordem pedida
+    return escalacao.iloc[ordem]
+
+
+# ==============================================================================
+# 4. GRÁFICOS E HTML (MONTADOS SEM STREAMLIT)
+# ==============================================================================
+
+def figura_gantt_membro(df_membro, cores_atuais, intervalos=None):
+    """Monta o gráfico de Gantt com todas as alocações de um membro (None se não houver barras com datas)."""
+    cor_proj_externo = cores_atuais[0]
+    cor_proj_interno = cores_atuais[1]
+    cor_atividades_extra = "#c72fc7"
+
+    fig = go.Figure()
+    yaxis_labels = []
+    yaxis_pos = []
+    current_pos = 0
+
+    # --- 1. Projetos externos e internos com início e fim, lidos da tabela de alocações ---
+    if intervalos is None:
+        intervalos = tabela_alocacoes(df_membro)
+    barras = intervalos[intervalos.index.isin(df_membro.index)]
+    barras = barras[barras["nome"].notna() & barras["inicio"].notna() & barras["fim"].notna()]
+    barras = barras.sort_values(["tipo", "slot"], kind="stable")
+
+    for tipo, cor in (("externo", cor_proj_externo), ("interno", cor_proj_interno)):
+        grupo = barras[barras["tipo"] == tipo]
+        if grupo.empty:
+            continue
+        posicoes = np.arange(current_pos + 1, current_pos + 1 + len(grupo))
+        current_pos += len(grupo)
+        yaxis_labels.extend(grupo["nome"].tolist())
+        yaxis_pos.extend(posicoes.tolist())
+
+        # Um único traço por tipo: segmentos [início, fim] separados por lacunas (None)
+        x = np.full(3 * len(grupo), None, dtype=object)
+        x[0::3], x[1::3] = grupo["inicio"].to_numpy(), grupo["fim"].to_numpy()
+        y = np.full(3 * len(grupo), None, dtype=object)
+        y[0::3], y[1::3] = posicoes, posicoes
+        fig.add_trace(go.Scatter(x=x, y=y, mode="lines", name=tipo, line=dict(color=cor, width=15),
+                                 hovertext=np.repeat(grupo["nome"].to_numpy(), 3), hoverinfo="text+x", showlegend=False))
+
+    # --- 2. Adiciona Alocações Extras (Aprendizagens/Assessorias) ---
+    hoje = datetime.today()
+    trimestre_inicio_mes = ((hoje.month - 1) // 3) * 3 + 1
+    data_inicio_trimestre = datetime(hoje.year, trimestre_inicio_mes, 1)
+    data_fim_trimestre = (data_inicio_trimestre + pd.DateOffset(months=3)) - pd.DateOffset(days=1)
+
+    if "N° Aprendizagens" in df_membro.columns and df_membro["N° Aprendizagens"].iloc[0] > 0:
+        current_pos += 1
+        label = f"Aprendizagem(ns) ({int(df_membro['N° Aprendizagens'].iloc[0])})"
+        yaxis_labels.append(label)
+        yaxis_pos.append(current_pos)
+        fig.add_trace(go.Scatter(x=[data_inicio_trimestre, data_fim_trimestre], y=[current_pos, current_pos], mode="lines", name=label, line=dict(color=cor_atividades_extra, width=15), showlegend=False))
+
+    if "N° Assessorias" in df_membro.columns and df_membro["N° Assessorias"].iloc[0] > 0:
+        current_pos += 1
+        label = f"Assessoria(s) ({int(df_membro['N° Assessorias'].iloc[0])})"
+        yaxis_labels.append(label)
+        yaxis_pos.append(current_pos)
+        fig.add_trace(go.Scatter(x=[data_inicio_trimestre, data_fim_trimestre], y=[current_pos, current_pos], mode="lines", name=label, line=dict(color=cor_atividades_extra, width=15), showlegend=False))
+
+    # --- 3. Configura o gráfico ---
+    if not yaxis_labels:
+        return None
+
+    fig.update_layout(
+        xaxis_title=None, yaxis_title=None,
+        xaxis=dict(tickformat="%d/%m/%Y", showgrid=True, gridcolor='lightgrey'),
+        yaxis=dict(tickvals=yaxis_pos, ticktext=yaxis_labels, autorange="reversed"),
+        plot_bgcolor='white', margin=dict(l=20, r=20, t=20, b=20)
+    )
+    return fig
+
+def figura_gantt_equipe(df_equipe, cores_atuais, intervalos=None):
+    """Gantt de vários membros: uma faixa por membro e um único traço WebGL por tipo de alocação.
+
+    Dentro da faixa, cada slot ganha um pequeno deslocamento para que alocações simultâneas não
+    se sobreponham. Retorna None se nenhum membro tiver alocações com datas.
+    """
+    if intervalos is None:
+        intervalos = tabela_alocacoes(df_equipe)
+    linhas = df_equipe.index.get_indexer(intervalos.index)
+    validas = (linhas >= 0) & intervalos["nome"].notna().to_numpy() \
+        & intervalos["inicio"].notna().to_numpy() & intervalos["fim"].notna().to_numpy()
+    if not validas.any():
+        return None
+    barras, linhas = intervalos[validas], linhas[validas]
+
+    nomes = df_equipe["Membro"].str.split(".").str.join(" ").str.title()
+    fig = go.Figure()
+    for tipo, cor, deslocamento in (("externo", cores_atuais[0], -0.3), ("interno", cores_atuais[1], 0.15)):
+        grupo = (barras["tipo"] == tipo).to_numpy()
+        if not grupo.any():
+            continue
+        posicoes = linhas[grupo] + deslocamento + (barras["slot"].to_numpy()[grupo] - 1) * 0.1
+        inicio, fim = barras["inicio"][grupo], barras["fim"][grupo]
+        texto = (nomes.to_numpy()[linhas[grupo]] + " — " + barras["nome"][grupo].astype(str).to_numpy() + " ("
+                 + inicio.dt.strftime("%d/%m/%Y").to_numpy() + " a " + fim.dt.strftime("%d/%m/%Y").to_numpy() + ")")
+
+        # Segmentos [início, fim] separados por lacunas, todos no mesmo traço
+        x = np.full(3 * len(posicoes), None, dtype=object)
+        x[0::3], x[1::3] = inicio.to_numpy(), fim.to_numpy()
+        y = np.full(3 * len(posicoes), np.nan)
+        y[0::3], y[1::3] = posicoes, posicoes
+        fig.add_trace(go.Scattergl(x=x, y=y, mode="lines", name=f"Projetos {tipo}s", line=dict(color=cor, width=5),
+                                   hovertext=np.repeat(texto, 3), hoverinfo="text"))
+
+    fig.add_vline(x=datetime.today(), line_dash="dash", line_color="grey")
+    fig.update_layout(
+        xaxis_title=None, yaxis_title=None, height=max(300, 22 * len(df_equipe) + 80),
+        xaxis=dict(tickformat="%d/%m/%Y", showgrid=True, gridcolor='lightgrey'),
+        yaxis=dict(tickvals=np.arange(len(df_equipe)), ticktext=nomes.to_numpy(), autorange="reversed", showgrid=False),
+        legend=dict(orientation="h", yanchor="bottom", y=1.0), plot_bgcolor='white', margin=dict(l=20, r=20, t=20, b=20)
+    )
+    return fig
+
+def figura_sensibilidade(posicoes, estabilidade, peso_atual=None):
+    """Posição de cada membro de `estabilidade` ao longo dos pesos, com o peso atual marcado."""
+    fig = go.Figure()
+    pesos = posicoes.columns.to_numpy()
+    for linha, membro in zip(estabilidade.index, estabilidade["Membro"]):
+        fig.add_trace(go.Scatter(x=pesos, y=posicoes.loc[linha].to_numpy(), mode="lines", name=membro,
+                                 line=dict(shape="hv"), hovertemplate=f"{membro}<br>Peso %{{x:.2f}}: %{{y}}º<extra></extra>"))
+    if peso_atual is not None:
+        fig.add_vline(x=peso_atual, line_dash="dash", line_color="grey")
+
+    fig.update_layout(
+        xaxis_title="Peso da Disponibilidade", yaxis_title="Posição",
+        xaxis=dict(showgrid=True, gridcolor='lightgrey'),
+        yaxis=dict(autorange="reversed", dtick=1, showgrid=True, gridcolor='lightgrey'),
+        plot_bgcolor='white', margin=dict(l=20, r=20, t=20, b=20)
+    )
+    return fig
+
+def figura_historico(historico, metrica):
+    """Evolução de uma métrica do histórico ao longo das cargas, com uma linha por núcleo."""
+    fig = go.Figure()
+    for nucleo, serie in historico.groupby("nucleo", sort=True):
+        fig.add_trace(go.Scatter(x=serie["momento"], y=serie[metrica], mode="lines+markers", name=nucleo,
+                                 hovertemplate=f"{nucleo}<br>%{{x|%d/%m/%Y %H:%M}}: %{{y:.1f}}<extra></extra>"))
+
+    fig.update_layout(
+        xaxis_title="Carga", yaxis_title=METRICAS_HISTORICO.get(metrica, metrica),
+        xaxis=dict(showgrid=True, gridcolor='lightgrey'), yaxis=dict(showgrid=True, gridcolor='lightgrey'),
+        plot_bgcolor='white', margin=dict(l=20, r=20, t=20, b=20), showlegend=historico["nucleo"].nunique() > 1
+    )
+    return fig
+
+# Modelo de um card; os campos são preenchidos por `html_card_membro` (um card) ou `html_cards` (vários)
+_MODELO_CARD = """
+    <div style="border: 2px solid #a1a1a1; padding: 15px; border-radius: 10px; width: 700px; color:{primary_color}; margin-bottom: 10px;">
+        <div style="display: flex; justify-content: space-between; align-items: center;">
+            <div style="flex: 1;">
+                <h3>{nome}</h3>
+                <p style="margin-bottom: 0;">Disponibilidade</p>
+                <div style="width: 80%; background-color: {bg_color}; border-radius: 5px; height: 20px; position: relative; margin-bottom: 5px;">
+                    <div style="width: {availability_pct}%; background-color: {availability_color}; height: 100%;"></div>
+                    <div style="position: absolute; top: 0; bottom: 0; width: 3px; background-color: black; left: {avg_availability_pct}%;"></div>
+                </div>
+                <p style="margin-bottom: 10px;">{disponibilidade}h / 30.0h</p>
+                <p style="margin-bottom: 0;">Afinidade</p>
+                <div style="width: 80%; background-color: {bg_color}; border-radius: 5px; height: 20px; position: relative;">
+                    <div style="width: {affinity_pct}%; background-color: {affinity_color}; height: 100%;"></div>
+                    <div style="position: absolute; top: 0; bottom: 0; width: 3px; background-color: black; left: {avg_affinity_pct}%;"></div>
+                </div>
+                <p>{afinidade} / 10.0</p>
+            </div>
+            <div style="text-align: right;"><h3>{nota_final}</h3></div>
+        </div>
+    </div>
+    """
+NOMES_MEDIA = ["Média Do Núcleo ⚠", "Média Do Núcleo"]
+
+def html_card_membro(dado_coluna, media_disp, media_afin, cores_nucleo):
+    """Gera o HTML do card de um membro (ou da média do núcleo)."""
+    nome = " ".join(part.capitalize() for part in dado_coluna['Membro'].split("."))
+    
+    # Define cores com base no tipo de linha (membro vs. média)
+    if nome in NOMES_MEDIA:
+        primary_color, bg_color = cores_nucleo or ("#064381", "#decda9")
+    else:
+        primary_color, bg_color = "#064381", "#decda9"
+
+    availability_pct = min(100, (dado_coluna['Disponibilidade'] / 30.0) * 100)
+    availability_color = '#2fa83b' if availability_pct > 70 else '#fbac04' if availability_pct >= 40 else '#c93220'
+    
+    affinity_pct = min(100, (dado_coluna['Afinidade'] / 10.0) * 100)
+    affinity_color = '#2fa83b' if affinity_pct > 70 else '#fbac04' if affinity_pct >= 40 else '#c93220'
+    
+    avg_availability_pct = min(100, (media_disp / 30.0) * 100)
+    avg_affinity_pct = min(100, (media_afin / 10.0) * 100)
+
+    return _MODELO_CARD.format(
+        primary_color=primary_color, nome=nome, bg_color=bg_color,
+        availability_pct=availability_pct, availability_color=availability_color, avg_availability_pct=avg_availability_pct,
+        disponibilidade=f"{dado_coluna['Disponibilidade']:.2f}",
+        affinity_pct=affinity_pct, affinity_color=affinity_color, avg_affinity_pct=avg_affinity_pct,
+        afinidade=f"{dado_coluna['Afinidade']:.2f}", nota_final=f"{dado_coluna['Nota Final']:.2f}")
+
+def html_cards(pontuacao, media_disp, media_afin, cores_nucleo):
+    """Gera, em uma única passada vetorizada, o HTML de todos os cards de `pontuacao`, na ordem das linhas.
+
+    Cada card sai idêntico ao de `html_card_membro`; o resultado é um único bloco para um só `st.markdown`.
+    """
+    if pontuacao.empty:
+        return ""
+
+    def percentual(valores, escala):
+        pct = valores / escala * 100
+        # Mesmo texto de min(100, pct): o inteiro 100 quando passa do teto
+        return np.where(pct >= 100, "100", pct.astype(str)).astype(object)
+
+    def cor_barra(valores, escala):
+        pct = np.minimum(100, valores / escala * 100)
+        return np.select([pct > 70, pct >= 40], ['#2fa83b', '#fbac04'], '#c93220').astype(object)
+
+    disponibilidade = pontuacao["Disponibilidade"].to_numpy(dtype=float)
+    afinidade = pontuacao["Afinidade"].to_numpy(dtype=float)
+    nomes = pontuacao["Membro"].map(lambda membro: " ".join(part.capitalize() for part in membro.split("."))).to_numpy(dtype=object)
+    eh_media = np.isin(nomes, NOMES_MEDIA)
+    cor_media, fundo_media = cores_nucleo or ("#064381", "#decda9")
+
+    campos = {
+        "primary_color": np.where(eh_media, cor_media, "#064381").astype(object),
+        "nome": nomes,
+        "bg_color": np.where(eh_media, fundo_media, "#decda9").astype(object),
+        "availability_pct": percentual(disponibilidade, 30.0),
+        "availability_color": cor_barra(disponibilidade, 30.0),
+        "avg_availability_pct": str(min(100, (media_disp / 30.0) * 100)),
+        "disponibilidade": np.char.mod("%.2f", disponibilidade).astype(object),
+        "affinity_pct": percentual(afinidade, 10.0),
+        "affinity_color": cor_barra(afinidade, 10.0),
+        "avg_affinity_pct": str(min(100, (media_afin / 10.0) * 100)),
+        "afinidade": np.char.mod("%.2f", afinidade).astype(object),
+        "nota_final": np.char.mod("%.2f", pontuacao["Nota Final"].to_numpy(dtype=float)).astype(object),
+    }
+
+    # Concatena trecho fixo + campo, coluna a coluna, para todos os cards ao mesmo tempo
+    cards = np.full(len(pontuacao), "", dtype=object)
+    for literal, campo, _, _ in string.Formatter().parse(_MODELO_CARD):
+        cards = cards + literal
+        if campo:
+            cards = cards + campos[campo]
+    return "".join(cards)
+
+
+# ==============================================================================
+# 5. HISTÓRICO DAS CARGAS (SQLITE)
+# ==============================================================================
+
+_ESQUEMA_HISTORICO = """
+CREATE TABLE IF NOT EXISTS cargas (
+    nucleo TEXT NOT NULL, momento TEXT NOT NULL, hash TEXT, membros INTEGER,
+    PRIMARY KEY (nucleo, momento)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS historico (
+    nucleo TEXT NOT NULL, membro TEXT NOT NULL, momento TEXT NOT NULL,
+    disponibilidade REAL, alocacoes INTEGER, saude_mental REAL,
+    PRIMARY KEY (nucleo, membro, momento)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS historico_nucleo_momento ON historico (nucleo, momento);
+"""
+
+def conectar_historico(caminho):
+    """Abre (e cria, se preciso) o banco do histórico. A chave primária atende às consultas de um membro
+    e o índice (nucleo, momento), às médias de um núcleo em um período."""
+    Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+    conexao = sqlite3.connect(caminho, timeout=30)
+    conexao.executescript(_ESQUEMA_HISTORICO)
+    return conexao
+
+def metricas_membros(df, momento):
+    """Métricas gravadas no histórico para cada membro da aba, calculadas na data da carga."""
+    intervalos = tabela_alocacoes(df)
+    saude = df["Saúde mental na PJ"].astype(float) if "Saúde mental na PJ" in df else pd.Series(np.nan, index=df.index)
+    return pd.DataFrame({"membro": df["Membro"].astype(str),
+                         "disponibilidade": calculo_disponibilidade(df, pd.Timestamp(momento).normalize(), intervalos),
+                         "alocacoes": calculo_alocacoes(df, intervalos), "saude_mental": saude})
+
+def registrar_historico(caminho, abas, hashes, momento=None):
+    """Acrescenta ao histórico as métricas das abas que mudaram desde o último registro (pelo hash)
+    ou cujo último registro tem mais de INTERVALO_HISTORICO. Retorna as abas registradas."""
+    momento = pd.Timestamp(momento or datetime.now()).floor("s")
+    registradas = []
+    conexao = conectar_historico(caminho)
+    try:
+        for aba, df in abas.items():
+            if df.empty or "Membro" not in df:
+                continue
+            ultimo = conexao.execute("SELECT momento, hash FROM cargas WHERE nucleo = ? ORDER BY momento DESC LIMIT 1",
+                                     (aba,)).fetchone()
+            if ultimo and ultimo[1] == hashes.get(aba) and momento - pd.Timestamp(ultimo[0]) < INTERVALO_HISTORICO:
+                continue
+
+            metricas = metricas_membros(df, momento)
+            linhas = zip(repeat(aba), metricas["membro"], repeat(momento.isoformat()),
+                         *(metricas[col].astype(object).where(metricas[col].notna(), None) for col in METRICAS_HISTORICO))
+            with conexao:
+                conexao.executemany("INSERT OR REPLACE INTO historico VALUES (?, ?, ?, ?, ?, ?)", linhas)
+                conexao.execute("INSERT OR REPLACE INTO cargas VALUES (?, ?, ?, ?)",
+                                (aba, momento.isoformat(), hashes.get(aba), len(metricas)))
+            registradas.append(aba)
+    finally:
+        conexao.close()
+    return registradas
+
+def registrar_carga_historico(estado, abas):
+    """Registra no histórico do estado (se houver) as abas de uma carga bem-sucedida, sem interromper a carga."""
+    if estado["historico"] is None or not abas:
+        return
+    try:
+        with medir_etapa("historico"):
+            registradas = registrar_historico(estado["historico"], {aba: estado["abas"][aba] for aba in abas}, estado["hashes"])
+        if registradas:
+            logging.info(f"Histórico atualizado: {registradas}")
+    except (sqlite3.Error, OSError) as e:
+        logging.warning(f"Não foi possível gravar o histórico em {estado['historico']}: {e}")
+
+def membros_historico(caminho, nucleos):
+    """Membros com registro no histórico dos núcleos (inclusive os que já saíram da planilha)."""
+    conexao = conectar_historico(caminho)
+    try:
+        linhas = conexao.execute(f"SELECT DISTINCT membro FROM historico WHERE nucleo IN ({', '.join('?' * len(nucleos))})",
+                                 list(nucleos)).fetchall()
+    finally:
+        conexao.close()
+    return sorted(membro for (membro,) in linhas)
+
+def consultar_historico(caminho, nucleos, membro=None, inicio=None, fim=None):
+    """Série de cada métrica do histórico no período: de um membro ou, sem `membro`, a média de cada núcleo.
+
+    Retorna um DataFrame com nucleo, momento, as colunas de METRICAS_HISTORICO e, nas médias, "membros".
+    """
+    filtros, parametros = [f"nucleo IN ({', '.join('?' * len(nucleos))})"], list(nucleos)
+    if membro is not None:
+        filtros.append("membro = ?")
+        parametros.append(membro)
+    if inicio is not None:
+        filtros.append("momento >= ?")
+        parametros.append(pd.Timestamp(inicio).isoformat())
+    if fim is not None:
+        filtros.append("momento < ?")  # Fim exclusivo: passe o dia seguinte para incluir o último dia
+        parametros.append(pd.Timestamp(fim).isoformat())
+
+    colunas = ", ".join(METRICAS_HISTORICO)
+    if membro is None:
+        colunas = ", ".join(f"AVG({col}) AS {col}" for col in METRICAS_HISTORICO) + ", COUNT(*) AS membros"
+    consulta = f"SELECT nucleo, momento, {colunas} FROM historico WHERE {' AND '.join(filtros)}"
+    consulta += " GROUP BY nucleo, momento" if membro is None else ""
+    conexao = conectar_historico(caminho)
+    try:
+        historico = pd.read_sql_query(consulta + " ORDER BY nucleo, momento", conexao, params=parametros)
+    finally:
+        conexao.close()
+    historico["momento"] = pd.to_datetime(historico["momento"])
+    return historico
@@ -6,41 +6,47 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import logging
+import threading
+import time
 from datetime import datetime
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-import plotly.graph_objects as go
+
+from motor_pcp import (
+    ABAS_NUCLEOS, ARQUIVO_HISTORICO, CARDS_POR_PAGINA, DIRETORIO_SNAPSHOT, MAX_MEMBROS_GANTT_EQUIPE, METRICAS_HISTORICO,
+    PORTFOLIOS, TODOS_NUCLEOS,
+    abrir_fonte, abrir_planilha, aplicar_filtros, calculo_afinidade, calculo_disponibilidade_periodo, carregar_snapshot,
+    carregar_todas_abas, concatenar_abas, concatenar_alocacoes, consultar_historico, diretorio_snapshot,
+    escalar_projetos, figura_gantt_equipe, figura_gantt_membro, figura_historico, figura_sensibilidade, html_cards,
+    identificador_fonte, indices_filtros, medir_etapa, membros_historico, metricas_cache, metricas_etapas,
+    metricas_google, nome_aba, nota_disponibilidade, novo_estado_carga, registrar_cache, resumo_por_nucleo,
+    salvar_prometheus, sensibilidade_pesos, tabela_alocacoes, varrer_datas_inicio,
+)
 
 # --- Configuração da Página e Logging ---
 st.set_page_config(page_title="Ambiente de Projetos", layout="wide", initial_sidebar_state="auto")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)  # Padrão a partir do pandas 3: fatias dos quadros compartilhados não copiam dados
 
 # ==============================================================================
 # 2. CONSTANTES E ESTILOS GLOBAIS
 # ==============================================================================
 
 # --- Constantes da Interface ---
-CARGOS_EXCLUIDOS = [
-    "Liderança de Outbound", "Coordenador de Negócios", "Coordenador de Inovação Comercial",
-    "Gerente Comercial", "Coordenador de Projetos", "Coordenador de Inovação de Projetos",
-    "Gerente de Projetos",
-]
-
-DATE_COLUMNS = [
-    "Início previsto Projeto 1", "Início Real Projeto 1", "Fim previsto do Projeto 1 (sem atraso)", "Fim estimado do Projeto 1 (com atraso)",
-    "Início previsto Projeto 2", "Início Real Projeto 2", "Fim previsto do Projeto 2 (sem atraso)", "Fim estimado do Projeto 2 (com atraso)",
-    "Início previsto Projeto 3", "Início Real Projeto 3", "Fim previsto do Projeto 3 (sem atraso)", "Fim estimado do Projeto 3 (com atraso)",
-    "Início previsto Projeto 4", "Início Real Projeto 4", "Fim previsto do Projeto 4 (sem atraso)", "Fim estimado do Projeto 4 (com atraso)",
-    "Início do Projeto Interno 1", "Fim do Projeto Interno 1", "Início do Projeto Interno 2", "Fim do Projeto Interno 2",
-    "Início do Projeto Interno 3", "Fim do Projeto Interno 3",
-]
-
 nucleo_cores = {"NCiv": ("#cd9a0f", "#e0d19b"),
     "NCon": ("#0db54b", "#91cfa7"),
     "NDados": ("#7419BE", "#c19be0"),
     "NI": ("#c91616", "#c26868"),
     "NTec": ("#1117c3", "#7477bf")}
 
+PRE_CARREGAR_ABAS = True  # Depois do primeiro núcleo aberto, busca os demais em segundo plano
+INTERVALO_ATUALIZACAO_S = 300  # Intervalo entre as revalidações das abas em segundo plano
+ARQUIVO_METRICAS = DIRETORIO_SNAPSHOT / "metricas.prom"  # Métricas no formato do Prometheus (coletor de textfile)
+INTERVALO_EXPORTACAO_S = 15  # Intervalo entre as gravações do arquivo de métricas
+CRITERIOS_DISPONIBILIDADE = {  # Como resumir as horas livres semana a semana no período do projeto
+    "Semana mais carregada": "minima",
+    "Média do período": "media",
+    "Só a data de início": None}
+
 # --- Estilo CSS Customizado ---
 st.markdown("""
     <link href="https://fonts.googleapis.com/icon?family=Material+Icons" rel="stylesheet">
@@ -55,204 +61,250 @@ st.markdown("""
 # 3. CARREGAMENTO E CACHE DE DADOS (BACKEND)
 # ==============================================================================
 
-@st.cache_data(ttl=86400)  # Cache de 1 dia
-def load_data_from_source():
-    """Função principal que carrega e processa os dados da fonte (Google Sheets)."""
+def config_fonte():
+    """Tipo e caminho da fonte dos dados, escolhidos em `pcp_fonte` nos secrets (padrão: a planilha do Google).
+
+    Exemplo para uma pasta de CSVs: `[pcp_fonte]` com `tipo = "csv"` e `caminho = "dados/pcp"`. Sem arquivo
+    de secrets vale a planilha, para o snapshot local continuar sendo servido.
+    """
     try:
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        creds_info = st.secrets["gcp_service_account"]
-        credentials = ServiceAccountCredentials.from_json_keyfile_dict(creds_info, scope)
-        client = gspread.authorize(credentials)
-        planilha = client.open("PCP Auto")
-        
-        abas = ["NDados", "NTec", "NCiv", "NI", "NCon"]
-        todas_abas = {}
+        config = dict(st.secrets.get("pcp_fonte", {}))
+    except FileNotFoundError:
+        config = {}
+    return config.get("tipo", "sheets"), config.get("caminho")
+
+def fonte_pcp():
+    """Fonte dos dados do PCP (ver `config_fonte`). A planilha usa a conexão reaproveitada do processo
+    (aberta pela chave, se estiver nos secrets)."""
+    tipo, caminho = config_fonte()
+    if tipo == "sheets":
+        return abrir_planilha(st.secrets["gcp_service_account"], chave=st.secrets.get("pcp_planilha_id"))
+    return abrir_fonte(tipo, caminho)
+
+def revalidar_abas(estado, abas=ABAS_NUCLEOS):
+    """Confere as abas contra a planilha e, se alguma já servida mudou, publica a nova versão.
+
+    Serve para a atualização periódica, para o botão "Atualizar dados" e para pré-carregar os núcleos
+    que ainda não foram abertos.
+    Os caches são limpos antes de a versão mudar: a sessão que vê a versão nova já recebe os quadros novos.
+    """
+    try:
+        hashes_antes = dict(estado["hashes"])
+        carregar_todas_abas(fonte_pcp(), abas=list(abas), estado=estado)
+        if any(estado["hashes"].get(aba) != hash_aba for aba, hash_aba in hashes_antes.items() if aba in abas):
+            limpar_cache_dados()
+            estado["versao"] += 1
+    except Exception as e:
+        # Em caso de falha, as sessões seguem com a última versão boa
+        logging.error(f"Erro ao revalidar as abas: {e}", exc_info=True)
+
+def atualizar_periodicamente(estado):
+    """Revalida as abas já carregadas a cada INTERVALO_ATUALIZACAO_S, sem nunca bloquear uma sessão.
 
+    A primeira passada é imediata, para revalidar o snapshot local servido no início a frio.
+    """
+    while True:
+        abas = [aba for aba in ABAS_NUCLEOS if aba in estado["abas"]]
+        if abas:
+            revalidar_abas(estado, abas)
+        time.sleep(INTERVALO_ATUALIZACAO_S)
+
+@st.cache_resource
+def estado_carga():
+    """Estado de carga compartilhado pelo processo, iniciado a partir do snapshot local quando existir.
+    Cada carga bem-sucedida é registrada no histórico (ARQUIVO_HISTORICO), exibido na página Histórico."""
+    tipo, caminho = config_fonte()
+    estado = novo_estado_carga(diretorio_snapshot(tipo, caminho), historico=ARQUIVO_HISTORICO,
+                               fonte=identificador_fonte(tipo, caminho))
+    carregar_snapshot(estado)
+    return estado
+
+@st.cache_resource
+def atualizador():
+    """Inicia, uma única vez por processo, a thread que mantém as abas em dia com a planilha."""
+    thread = threading.Thread(target=atualizar_periodicamente, args=(estado_carga(),), daemon=True)
+    thread.start()
+    return thread
+
+def exportar_metricas_periodicamente():
+    """Regrava o arquivo de métricas a cada INTERVALO_EXPORTACAO_S, fora do caminho das sessões."""
+    while True:
+        try:
+            salvar_prometheus(ARQUIVO_METRICAS)
+        except OSError as e:
+            logging.warning(f"Não foi possível gravar as métricas em {ARQUIVO_METRICAS}: {e}")
+        time.sleep(INTERVALO_EXPORTACAO_S)
+
+@st.cache_resource
+def exportador_metricas():
+    """Inicia, uma única vez por processo, a thread que exporta as métricas para o Prometheus."""
+    thread = threading.Thread(target=exportar_metricas_periodicamente, daemon=True)
+    thread.start()
+    return thread
+
+# cache_resource, e não cache_data: as abas são o mesmo objeto para todas as sessões do processo, sem uma
+# cópia por sessão. Nenhuma sessão altera esses quadros; métricas derivadas ficam em Series à parte.
+# Sem ttl: quem invalida o cache é o atualizador, e só quando alguma aba muda (stale-while-revalidate).
+@st.cache_resource
+def load_data_from_source(abas=tuple(ABAS_NUCLEOS)):
+    """Serve as abas pedidas na hora, a partir da última versão boa; só espera pela fonte na primeira carga de cada aba."""
+    try:
+        estado = estado_carga()
+        atualizador()
+        exportador_metricas()
+
+        faltantes = [aba for aba in abas if aba not in estado["abas"]]
         for aba in abas:
-            try:
-                aba_aberta = planilha.worksheet(aba)
-                data = aba_aberta.get_all_values()
-                if not data:
-                    todas_abas[aba] = pd.DataFrame()
-                    continue
-
-                headers = data[0]
-                values = data[1:]
-
-                pcp_df = pd.DataFrame(values, columns=headers)
-                pcp_df.replace('', np.nan, inplace=True)
-                
-                # Limpeza primária dos dados
-                if 'Membro' in pcp_df.columns:
-                    pcp_df.dropna(subset=['Membro'], inplace=True)
-                if "Cargo no núcleo" in pcp_df.columns:
-                    pcp_df = pcp_df[~pcp_df["Cargo no núcleo"].isin(CARGOS_EXCLUIDOS)]
-
-                # Conversão de tipos de dados (Datas e Números)
-                for date_col in DATE_COLUMNS:
-                    if date_col in pcp_df.columns:
-                        pcp_df[date_col] = pd.to_datetime(pcp_df[date_col], format="%d/%m/%Y", errors='coerce')
-                
-                todas_abas[aba] = pcp_df
-
-            except Exception as e:
-                logging.error(f"Erro ao processar aba '{aba}': {e}", exc_info=True)
-                todas_abas[aba] = pd.DataFrame()
-        return todas_abas
+            registrar_cache("abas_processo", aba not in faltantes)
+        if faltantes:
+            carregar_todas_abas(fonte_pcp(), abas=faltantes, estado=estado)
+            sem_dados = [aba for aba in faltantes if aba not in estado["hashes"]]
+            if sem_dados:
+                # Exceções não entram no cache: a próxima execução tenta de novo, em vez de guardar abas vazias
+                raise RuntimeError(f"Abas sem dados após as retentativas: {sem_dados}")
+
+            # Pré-carrega os outros núcleos enquanto o usuário olha o primeiro
+            restantes = [aba for aba in ABAS_NUCLEOS if aba not in estado["abas"]]
+            if PRE_CARREGAR_ABAS and restantes:
+                threading.Thread(target=revalidar_abas, args=(estado, restantes), daemon=True).start()
+
+        # As abas já vêm compactadas e sem colunas vazias (ver `compactar_aba`)
+        return {aba: estado["abas"][aba] for aba in abas}
         
     except Exception as e:
         logging.error(f"Erro fatal ao conectar ou carregar dados: {e}", exc_info=True)
-        st.error("Erro fatal de conexão. Verifique as credenciais e a API do Google Sheets.", icon="🚨")
+        st.error("Erro fatal de conexão. Verifique a fonte de dados configurada (credenciais e API do Google Sheets, "
+                 "ou o caminho da fonte local).", icon="🚨")
         st.stop()
 
+@st.cache_resource
+def load_alocacoes_from_source(abas=tuple(ABAS_NUCLEOS)):
+    """Monta, uma vez por versão dos dados, a tabela longa de alocações de cada aba pedida."""
+    alocacoes = {}
+    for aba, df in load_data_from_source(abas).items():
+        with medir_etapa("tabela_alocacoes", aba):
+            alocacoes[aba] = tabela_alocacoes(df)
+    return alocacoes
+
+@st.cache_resource
+def load_todos_from_source():
+    """Junta as abas e as alocações do modo "Todos" uma única vez por processo."""
+    abas = tuple(ABAS_NUCLEOS)
+    return (concatenar_abas(load_data_from_source(abas)),
+            concatenar_alocacoes(load_alocacoes_from_source(abas)))
+
+def limpar_cache_dados():
+    """Invalida os caches dos dados servidos; a próxima execução os remonta a partir do estado do processo."""
+    load_data_from_source.clear()
+    load_alocacoes_from_source.clear()
+    load_todos_from_source.clear()
+
 
 # ==============================================================================
 # 4. FUNÇÕES DE LÓGICA (BACKEND)
 # ==============================================================================
 
-def escolher_nucleo(nucleo):
-    """Filtra e retorna o DataFrame para o núcleo selecionado."""
-    correção_nucleo = {"nciv": "NCiv", "ncon": "NCon", "ndados": "NDados", "ni": "NI", "ntec": "NTec"}
-    aba = correção_nucleo.get(nucleo.lower(), nucleo)
-    
+def carregar_dados_sessao():
+    """Prepara a sessão para receber as abas e retorna a versão dos dados (muda a cada recarga ou atualização)."""
+    versao_processo = estado_carga()["versao"]
+    if st.session_state.get("pcp_versao_processo") != versao_processo:
+        # O atualizador publicou dados novos: a sessão troca para eles na próxima leitura
+        st.session_state.pop("pcp_data", None)
     if "pcp_data" not in st.session_state:
-        st.session_state.pcp_data = load_data_from_source()
-        
-    df = st.session_state.pcp_data.get(aba)
-    if df is None or df.empty:
-        return pd.DataFrame()
-    
-    # Remove colunas que estejam totalmente vazias
-    return df.dropna(axis=1, how='all').copy()
-
-def calculo_disponibilidade(df, inicio_novo_projeto):
-    """ Calcula as horas de disponibilidade para cada membro (versão vetorizada e segura). """
-    horas = pd.Series(30.0, index=df.index)
-    inicio_novo_projeto = pd.to_datetime(inicio_novo_projeto) # Garante que a data seja do tipo correto
-
-    # --- Descontos por atividades numéricas (Acesso Seguro) ---
-    if "N° Aprendizagens" in df:
-        horas -= pd.to_numeric(df["N° Aprendizagens"], errors='coerce').fillna(0) * 5
-    if "N° Assessorias" in df:
-        horas -= pd.to_numeric(df["N° Assessorias"], errors='coerce').fillna(0) * 10
-
-    # --- Descontos por projetos internos e cargos (Acesso Seguro) ---
-    for i in range(1, 5):
-        col_interno = f"Início do Projeto Interno {i}"
-        if col_interno in df.columns:
-            horas -= np.where(df[col_interno].notna(), 5, 0)
-    
-    cargos_especiais = ["SDR", "Hunter", "Analista Sênior", "Liderança de Chapter", "Product Manager"]
-    if "Cargo no núcleo" in df.columns:
-        # .str acessores são seguros contra valores nulos (NaN)
-        is_special_role = df["Cargo no núcleo"].str.strip().str.upper().isin(cargos_especiais)
-        horas -= np.where(is_special_role.fillna(False), 10, 0)
-        
-    # --- Descontos por projetos externos (Acesso Seguro) ---
-    for i in range(1, 5):
-        col_projeto = f"Projeto {i}"
-        if col_projeto in df.columns:
-            col_fim_estimado = f"Fim estimado do Projeto {i} (com atraso)"
-            col_fim_previsto = f"Fim previsto do Projeto {i} (sem atraso)"
-
-            # Acessa a coluna de data apenas se ela existir, senão cria uma série vazia.
-            fim_estimado = df[col_fim_estimado] if col_fim_estimado in df else pd.Series(pd.NaT, index=df.index)
-            fim_previsto = df[col_fim_previsto] if col_fim_previsto in df else pd.Series(pd.NaT, index=df.index)
-            
-            # Agora a operação .fillna() é 100% segura.
-            fim_final = fim_estimado.fillna(fim_previsto)
-            
-            # Lógica de desconto baseada na data de fim
-            data_final_existe = fim_final.notna()
-            dias_restantes = (fim_final - inicio_novo_projeto).dt.days
-            
-            desconto_com_data = np.select(
-                [dias_restantes > 14, (dias_restantes > 7) & (dias_restantes <= 14), dias_restantes <= 7],
-                [10, 4, 1],
-                default=0
-            )
-            horas -= np.where(data_final_existe, desconto_com_data, 0)
-            
-            # Lógica para projeto que existe mas não tem data de fim
-            sem_data_final = df[col_projeto].notna() & fim_final.isna()
-            horas -= np.where(sem_data_final, 10, 0)
-            
-    return horas
-
-def calculo_afinidade(df, portfolio):
-    """Calcula a nota de afinidade para cada membro (versão vetorizada e segura)."""
-
-    # --- Critério 1: Satisfação com o Portfólio (Acesso Seguro) ---
-    col_satisfacao = f"Satisfação com o Portfólio: {portfolio}"
-    if col_satisfacao in df:
-        # Se a coluna existir, calcula a satisfação a partir dela
-        satisfacao = pd.to_numeric(df[col_satisfacao], errors='coerce').fillna(3.0) * 2
-    else:
-        # Se não existir, atribui um valor padrão para todos os membros
-        satisfacao = pd.Series(6.0, index=df.index)  # (Valor padrão 3.0 * 2)
+        st.session_state.pcp_data = {}
+        st.session_state.pcp_alocacoes = {}
+        st.session_state.pcp_versao = st.session_state.get("pcp_versao", 0) + 1
+        st.session_state.pcp_versao_processo = versao_processo
+    return st.session_state.pcp_versao
 
-    # --- Critério 2: Capacidade Técnica (Lógica já era segura) ---
-    col_capacidade = [f"Validação média do Projeto {i}" for i in range(1, 5) if f"Validação média do Projeto {i}" in df.columns]
-    if col_capacidade:
-        capacidade = df[col_capacidade].apply(pd.to_numeric, errors='coerce').mean(axis=1).fillna(3.0) * 2
-    else:
-        # Se nenhuma coluna de validação existir, atribui um valor padrão
-        capacidade = pd.Series(6.0, index=df.index)
-
-    # --- Critério 3: Saúde Mental (Acesso Seguro) ---
-    # Sentimento em relação à carga
-    if "Como se sente em relação à carga" in df:
-        sentimento_map = {"SUBALOCADO": 10, "ESTOU SATISFEITO": 5, "SUPERALOCADO": 1}
-        pontuacao_sentimento = df["Como se sente em relação à carga"].str.strip().str.upper().map(sentimento_map).fillna(5)
-    else:
-        pontuacao_sentimento = pd.Series(5.0, index=df.index)
-        
-    # Saúde mental na PJ
-    if "Saúde mental na PJ" in df:
-        saude_mental = pd.to_numeric(df["Saúde mental na PJ"], errors='coerce').fillna(5.0)
-    else:
-        saude_mental = pd.Series(5.0, index=df.index)
+def carregar_abas_sessao(abas):
+    """Traz para a sessão só as abas pedidas que ainda não estão nela, com as suas tabelas de alocações.
 
-    saude_mental_final = (pontuacao_sentimento + saude_mental) / 2
-    
-    # --- Cálculo Final da Afinidade ---
-    return (satisfacao + capacidade + saude_mental_final) / 3
+    A sessão guarda referências aos quadros compartilhados do processo, não cópias.
+    """
+    versao = carregar_dados_sessao()
+    for aba in abas:
+        registrar_cache("abas_sessao", aba in st.session_state.pcp_data)
+    faltantes = tuple(aba for aba in abas if aba not in st.session_state.pcp_data and aba != TODOS_NUCLEOS)
+    if faltantes:
+        st.session_state.pcp_data.update(load_data_from_source(faltantes))
+        st.session_state.pcp_alocacoes.update(load_alocacoes_from_source(faltantes))
+    if TODOS_NUCLEOS in abas and TODOS_NUCLEOS not in st.session_state.pcp_data:
+        st.session_state.pcp_data[TODOS_NUCLEOS], st.session_state.pcp_alocacoes[TODOS_NUCLEOS] = load_todos_from_source()
+    return versao
 
-def calculo_alocacoes(df):
-    """Calcula o número total de alocações para cada membro (versão ajustada)."""
-    conta = pd.Series(0, index=df.index, dtype=int)
-    
-    # --- 1. Contagem de projetos externos ---
-    for i in range(1, 5):
-        col_projeto = f"Projeto {i}"
-        if col_projeto in df.columns:
-            
-            # --- LÓGICA ALTERADA ---
-            # Agora, um projeto conta como uma alocação simplesmente se ele existe (tem um nome na célula).
-            # A verificação da data de fim foi removida para esta contagem.
-            ativo = df[col_projeto].notna()
-            conta += ativo.astype(int)
-
-    # --- 2. Contagem de atividades "flag" ---
-    atividades_simples = ["Projeto Interno 1", "Projeto Interno 2", "Projeto Interno 3", "Cargo WI", "Cargo MKT"]
-    for col in atividades_simples:
-        if col in df.columns:
-            conta += df[col].notna().astype(int)
-
-    # --- 3. Soma dos valores de atividades numéricas ---
-    atividades_numericas = ["N° Aprendizagens", "N° Assessorias"]
-    for col in atividades_numericas:
-        if col in df.columns:
-            valores_numericos = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            conta += valores_numericos.astype(int)
-
-    # --- 4. Contagem de cargos específicos (LÓGICA CORRIGIDA) ---
-    if "Cargo no núcleo" in df.columns:
-        # Adiciona 1 se o cargo contiver a palavra "Comercial"
-        eh_comercial = df["Cargo no núcleo"].str.contains("Comercial", case=False, na=False)
-        conta += eh_comercial.astype(int)
-        
-    return conta
+def escolher_nucleo(nucleo):
+    """Retorna o DataFrame do núcleo selecionado (ou de todas as abas juntas, no modo "Todos").
+
+    O quadro é compartilhado entre as sessões e já vem sem colunas vazias: use-o só para leitura.
+    """
+    aba = nome_aba(nucleo)
+    carregar_abas_sessao([aba])
+    df = st.session_state.pcp_data.get(aba)
+    if df is None or df.empty:
+        return pd.DataFrame()
+    return df
+
+def escolher_alocacoes(nucleo):
+    """Retorna a tabela longa de alocações do núcleo selecionado (carregada junto com `escolher_nucleo`)."""
+    aba = nome_aba(nucleo)
+    carregar_abas_sessao([aba])
+    return st.session_state.pcp_alocacoes.get(aba)
+
+def idade_dados(nucleo):
+    """Tempo desde a última conferência das abas do núcleo com a planilha (a mais antiga, no modo "Todos")."""
+    aba = nome_aba(nucleo)
+    verificado_em = estado_carga()["verificado_em"]
+    datas = [verificado_em.get(a) for a in (ABAS_NUCLEOS if aba == TODOS_NUCLEOS else [aba])]
+    if any(data is None for data in datas):
+        return None
+    return datetime.now() - min(datas)
+
+def tamanho_em_bytes(valor, ignorar=frozenset()):
+    """Memória ocupada pelos arrays de `valor` (DataFrames, Series, arrays e coleções deles).
+
+    Objetos cujo id está em `ignorar` não entram na conta.
+    """
+    if id(valor) in ignorar:
+        return 0
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        uso = valor.memory_usage(index=True)
+        return int(uso.sum() if isinstance(valor, pd.DataFrame) else uso)
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, (tuple, list)):
+        return sum(tamanho_em_bytes(item, ignorar) for item in valor)
+    if isinstance(valor, dict):
+        return sum(tamanho_em_bytes(item, ignorar) for item in valor.values())
+    return 0
+
+def memoria_sessao():
+    """Bytes próprios da sessão (etapas memorizadas) e bytes dos quadros compartilhados que ela referencia."""
+    compartilhados = [*st.session_state.get("pcp_data", {}).values(), *st.session_state.get("pcp_alocacoes", {}).values()]
+    ids_compartilhados = frozenset(map(id, compartilhados))
+    propria = tamanho_em_bytes(st.session_state.get("pcp_memo", {}), ids_compartilhados)
+    return propria, tamanho_em_bytes(compartilhados)
+
+def aba_atual():
+    """Aba do núcleo aberto na sessão, usada como rótulo das métricas ("" se nenhum foi escolhido)."""
+    return nome_aba(st.session_state.nucleo) if st.session_state.get("nucleo") else ""
+
+def memo_etapa(etapa, chave, calcular):
+    """Reaproveita o resultado de uma etapa do cálculo enquanto a chave das suas entradas não mudar.
+
+    Guarda uma entrada por etapa na sessão; a chave deve incluir a versão dos dados e tudo de que
+    a etapa depende, para que cada widget recalcule apenas as etapas abaixo dele. Acertos, faltas e
+    o tempo de cada cálculo entram nas métricas do processo, rotulados com a aba do núcleo aberto.
+    """
+    memo = st.session_state.setdefault("pcp_memo", {})
+    acerto = etapa in memo and memo[etapa][0] == chave
+    registrar_cache(f"memo_{etapa}", acerto)
+    if acerto:
+        return memo[etapa][1]
+    with medir_etapa(etapa, aba_atual()):
+        valor = calcular()
+    memo[etapa] = (chave, valor)
+    return valor
 
 def sincronizar_pesos():
     """Verifica qual caixa foi alterada e ajusta a outra."""
@@ -265,7 +317,12 @@ def sincronizar_pesos():
     elif caixa_peso == 'afin':
         st.session_state.peso_disp = round(1.0 - st.session_state.peso_afin, 2)
 
-def exibir_gantt_membro(df_membro, nucleo_selecionado, cores_por_nucleo):
+
+# ==============================================================================
+# 5. FUNÇÕES DE EXIBIÇÃO (FRONTEND)
+# ==============================================================================
+
+def exibir_gantt_membro(df_membro, nucleo_selecionado, cores_por_nucleo, intervalos=None):
     """Gera e exibe um gráfico de Gantt completo com todas as alocações de um membro (versão segura)."""
     if df_membro.empty or len(df_membro) > 1:
         st.warning("Selecione um único membro para ver o gráfico de alocações.")
@@ -273,138 +330,33 @@ def exibir_gantt_membro(df_membro, nucleo_selecionado, cores_por_nucleo):
 
     # --- Prepara Cores e Dados Iniciais ---
     cores_atuais = cores_por_nucleo.get(nucleo_selecionado, ("#064381", "#decda9"))
-    cor_proj_externo = cores_atuais[0]
-    cor_proj_interno = cores_atuais[1]
-    cor_atividades_extra = "#c72fc7"
 
     nome_membro = df_membro['Membro'].iloc[0]
     nome_formatado = " ".join(part.capitalize() for part in nome_membro.split("."))
     st.subheader(f"Linha do Tempo de Alocações: {nome_formatado}")
 
-    fig = go.Figure()
-    yaxis_labels = []
-    yaxis_pos = []
-    current_pos = 0
-
-    # --- 1. Adiciona Projetos Externos ---
-    for i in range(1, 5):
-        col_projeto = f"Projeto {i}"
-        if col_projeto in df_membro.columns and pd.notna(df_membro[col_projeto].iloc[0]):
-            col_inicio = f"Início Real Projeto {i}"
-            col_fim_estimado = f"Fim estimado do Projeto {i} (com atraso)"
-            col_fim_previsto = f"Fim previsto do Projeto {i} (sem atraso)"
-            
-            inicio = df_membro[col_inicio].iloc[0] if col_inicio in df_membro and pd.notna(df_membro[col_inicio].iloc[0]) else None
-            fim = None
-            if col_fim_estimado in df_membro and pd.notna(df_membro[col_fim_estimado].iloc[0]):
-                fim = df_membro[col_fim_estimado].iloc[0]
-            elif col_fim_previsto in df_membro and pd.notna(df_membro[col_fim_previsto].iloc[0]):
-                fim = df_membro[col_fim_previsto].iloc[0]
-
-            if pd.notna(inicio) and pd.notna(fim):
-                current_pos += 1
-                yaxis_labels.append(df_membro[col_projeto].iloc[0])
-                yaxis_pos.append(current_pos)
-                fig.add_trace(go.Scatter(x=[inicio, fim], y=[current_pos, current_pos], mode="lines", name=df_membro[col_projeto].iloc[0], line=dict(color=cor_proj_externo, width=15), showlegend=False))
-
-    # --- 2. Adiciona Projetos Internos (LÓGICA CORRIGIDA) ---
-    for i in range(1, 4):
-        col_projeto = f"Projeto Interno {i}"
-        if col_projeto in df_membro.columns and pd.notna(df_membro[col_projeto].iloc[0]):
-            
-            col_inicio = f"Início do Projeto Interno {i}"
-            col_fim = f"Fim do Projeto Interno {i}"
-            
-            inicio = df_membro[col_inicio].iloc[0] if col_inicio in df_membro and pd.notna(df_membro[col_inicio].iloc[0]) else None
-            fim = df_membro[col_fim].iloc[0] if col_fim in df_membro and pd.notna(df_membro[col_fim].iloc[0]) else None
-            
-            if pd.notna(inicio) and pd.notna(fim):
-                current_pos += 1
-                yaxis_labels.append(df_membro[col_projeto].iloc[0])
-                yaxis_pos.append(current_pos)
-                fig.add_trace(go.Scatter(x=[inicio, fim], y=[current_pos, current_pos], mode="lines", name=df_membro[col_projeto].iloc[0], line=dict(color=cor_proj_interno, width=15), showlegend=False))
-
-    # --- 3. Adiciona Alocações Extras (Aprendizagens/Assessorias) ---
-    hoje = datetime.today()
-    trimestre_inicio_mes = ((hoje.month - 1) // 3) * 3 + 1
-    data_inicio_trimestre = datetime(hoje.year, trimestre_inicio_mes, 1)
-    data_fim_trimestre = (data_inicio_trimestre + pd.DateOffset(months=3)) - pd.DateOffset(days=1)
-
-    if "N° Aprendizagens" in df_membro.columns and pd.to_numeric(df_membro["N° Aprendizagens"].iloc[0], errors='coerce') > 0:
-        current_pos += 1
-        label = f"Aprendizagem(ns) ({int(df_membro['N° Aprendizagens'].iloc[0])})"
-        yaxis_labels.append(label)
-        yaxis_pos.append(current_pos)
-        fig.add_trace(go.Scatter(x=[data_inicio_trimestre, data_fim_trimestre], y=[current_pos, current_pos], mode="lines", name=label, line=dict(color=cor_atividades_extra, width=15), showlegend=False))
-
-    if "N° Assessorias" in df_membro.columns and pd.to_numeric(df_membro["N° Assessorias"].iloc[0], errors='coerce') > 0:
-        current_pos += 1
-        label = f"Assessoria(s) ({int(df_membro['N° Assessorias'].iloc[0])})"
-        yaxis_labels.append(label)
-        yaxis_pos.append(current_pos)
-        fig.add_trace(go.Scatter(x=[data_inicio_trimestre, data_fim_trimestre], y=[current_pos, current_pos], mode="lines", name=label, line=dict(color=cor_atividades_extra, width=15), showlegend=False))
-
-    # --- Configura e exibe o gráfico ---
-    if not yaxis_labels:
+    with medir_etapa("figura_gantt_membro", aba_atual()):
+        fig = figura_gantt_membro(df_membro, cores_atuais, intervalos)
+    if fig is None:
         st.info(f"{nome_formatado} não possui alocações com datas para exibir no gráfico.")
         return
-        
-    fig.update_layout(
-        xaxis_title=None, yaxis_title=None,
-        xaxis=dict(tickformat="%d/%m/%Y", showgrid=True, gridcolor='lightgrey'),
-        yaxis=dict(tickvals=yaxis_pos, ticktext=yaxis_labels, autorange="reversed"),
-        plot_bgcolor='white', margin=dict(l=20, r=20, t=20, b=20)
-    )
     st.plotly_chart(fig, use_container_width=True)
 
-# ==============================================================================
-# 5. FUNÇÕES DE EXIBIÇÃO (FRONTEND)
-# ==============================================================================
+def exibir_gantt_equipe(df_equipe, nucleo_selecionado, cores_por_nucleo, intervalos, chave):
+    """Exibe a linha do tempo de vários membros de uma vez (uma faixa por membro).
 
-def card_membro(dado_coluna, media_disp, media_afin, cores_nucleo):
-    """Gera o HTML para exibir um card de membro."""
-    nome = " ".join(part.capitalize() for part in dado_coluna['Membro'].split("."))
-    
-    # Define cores com base no tipo de linha (membro vs. média)
-    if "Média Do Núcleo ⚠" == nome or "Média Do Núcleo" == nome:
-        primary_color, bg_color = cores_nucleo
-    else:
-        primary_color, bg_color = "#064381", "#decda9"
-
-    availability_pct = min(100, (dado_coluna['Disponibilidade'] / 30.0) * 100)
-    availability_color = '#2fa83b' if availability_pct > 70 else '#fbac04' if availability_pct >= 40 else '#c93220'
-    
-    affinity_pct = min(100, (dado_coluna['Afinidade'] / 10.0) * 100)
-    affinity_color = '#2fa83b' if affinity_pct > 70 else '#fbac04' if affinity_pct >= 40 else '#c93220'
-    
-    avg_availability_pct = min(100, (media_disp / 30.0) * 100)
-    avg_affinity_pct = min(100, (media_afin / 10.0) * 100)
-
-    card_html = f"""
-    <div style="border: 2px solid #a1a1a1; padding: 15px; border-radius: 10px; width: 700px; color:{primary_color}; margin-bottom: 10px;">
-        <div style="display: flex; justify-content: space-between; align-items: center;">
-            <div style="flex: 1;">
-                <h3>{nome}</h3>
-                <p style="margin-bottom: 0;">Disponibilidade</p>
-                <div style="width: 80%; background-color: {bg_color}; border-radius: 5px; height: 20px; position: relative; margin-bottom: 5px;">
-                    <div style="width: {availability_pct}%; background-color: {availability_color}; height: 100%;"></div>
-                    <div style="position: absolute; top: 0; bottom: 0; width: 3px; background-color: black; left: {avg_availability_pct}%;"></div>
-                </div>
-                <p style="margin-bottom: 10px;">{dado_coluna['Disponibilidade']:.2f}h / 30.0h</p>
-                <p style="margin-bottom: 0;">Afinidade</p>
-                <div style="width: 80%; background-color: {bg_color}; border-radius: 5px; height: 20px; position: relative;">
-                    <div style="width: {affinity_pct}%; background-color: {affinity_color}; height: 100%;"></div>
-                    <div style="position: absolute; top: 0; bottom: 0; width: 3px; background-color: black; left: {avg_affinity_pct}%;"></div>
-                </div>
-                <p>{dado_coluna['Afinidade']:.2f} / 10.0</p>
-            </div>
-            <div style="text-align: right;"><h3>{dado_coluna['Nota Final']:.2f}</h3></div>
-        </div>
-    </div>
+    A figura é montada uma vez por `chave` (versão dos dados + filtros) e reaproveitada nas próximas execuções.
     """
+    if len(df_equipe) > MAX_MEMBROS_GANTT_EQUIPE:
+        st.caption(f"Exibindo os {MAX_MEMBROS_GANTT_EQUIPE} primeiros de {len(df_equipe)} membros; use os filtros para refinar.")
+        df_equipe = df_equipe.iloc[:MAX_MEMBROS_GANTT_EQUIPE]
 
-    # Exibe o card HTML
-    st.markdown(card_html, unsafe_allow_html=True)
+    cores_atuais = cores_por_nucleo.get(nucleo_selecionado, ("#064381", "#decda9"))
+    fig = memo_etapa("figura_gantt_equipe", chave, lambda: figura_gantt_equipe(df_equipe, cores_atuais, intervalos))
+    if fig is None:
+        st.info("Nenhum dos membros selecionados possui alocações com datas para exibir no gráfico.")
+    else:
+        st.plotly_chart(fig, use_container_width=True)
 
 
 # ==============================================================================
@@ -412,17 +364,32 @@ def card_membro(dado_coluna, media_disp, media_afin, cores_nucleo):
 # ==============================================================================
 
 # --- Navegação e Título ---
-pagina = st.sidebar.selectbox("Escolha uma página", ("Base Consolidada", "PCP"))
+pagina = st.sidebar.selectbox("Escolha uma página", ("Base Consolidada", "PCP", "Histórico"))
+if st.sidebar.button("🔄 Atualizar dados"):
+    # Confere agora as abas já carregadas, sem esperar o atualizador; só as alteradas são baixadas e reprocessadas
+    with st.spinner("Conferindo a planilha..."):
+        revalidar_abas(estado_carga(), [aba for aba in ABAS_NUCLEOS if aba in estado_carga()["abas"]])
 st.title(pagina)
+if "pcp_data" in st.session_state:
+    memoria_propria, memoria_compartilhada = memoria_sessao()
+    st.sidebar.caption(f"Memória desta sessão: {memoria_propria / 2**20:.1f} MiB "
+                       f"(+ {memoria_compartilhada / 2**20:.1f} MiB compartilhados entre as sessões)")
+chamadas_google = metricas_google().values()
+if chamadas_google:
+    st.sidebar.caption(f"Chamadas ao Google: {sum(c['chamadas'] for c in chamadas_google)} "
+                       f"({sum(c['retentativas'] for c in chamadas_google)} retentativas, "
+                       f"{sum(c['falhas'] for c in chamadas_google)} falhas)")
 
 # --- Seleção de Núcleo ---
 if "nucleo" not in st.session_state: st.session_state.nucleo = None
-colnan, colciv, colcon, coldados, colni, coltec = st.columns([1, 2, 2, 2, 2, 2])
+coltodos, colciv, colcon, coldados, colni, coltec = st.columns([1, 2, 2, 2, 2, 2])
+if coltodos.button(TODOS_NUCLEOS): st.session_state.nucleo = TODOS_NUCLEOS
 if colciv.button("NCiv"): st.session_state.nucleo = "NCiv"
 if colcon.button("NCon"): st.session_state.nucleo = "NCon"
 if coldados.button("NDados"): st.session_state.nucleo = "NDados"
 if colni.button("NI"): st.session_state.nucleo = "NI"
 if coltec.button("NTec"): st.session_state.nucleo = "NTec"
+aviso_idade = st.sidebar.empty()  # Preenchido no fim da página, depois que o núcleo já foi carregado
 
 # ---------------------------------
 # --- PÁGINA: BASE CONSOLIDADA ---
@@ -437,40 +404,39 @@ if pagina == "Base Consolidada":
                 st.stop()
 
             # --- Filtros da Página ---
+            # Índices (valor → linhas) e opções dos seletores montados uma vez por versão dos dados
+            intervalos = escolher_alocacoes(st.session_state.nucleo)
+            chave_indices = (carregar_dados_sessao(), nome_aba(st.session_state.nucleo))
+            indices = memo_etapa("indices_filtros", chave_indices, lambda: indices_filtros(df, intervalos))
             colcargo, colnome, colaloc = st.columns(3)
             #filtro pelo cargo
-            if "Cargo no núcleo" in df.columns:  
-                opcoes_cargo = sorted(df["Cargo no núcleo"].dropna().unique())
-            else:
-                opcoes_cargo = ["Todos"]
+            opcoes_cargo = indices["opcoes_cargo"] or ["Todos"]
             cargo_filtro = colcargo.selectbox("**Filtrar por Cargo**", options=opcoes_cargo, index= None, placeholder="Selecione o Cargo")
             #filtro pelo nome
-            opcoes_nome = sorted(df["Membro"].dropna().unique())
+            opcoes_nome = indices["opcoes_membro"]
             nome_filtro = colnome.selectbox("**Filtrar por Membro**", options=opcoes_nome, index= None, placeholder="Selecione o Membro")
             #filtro pelo número de alocações
-            opcoes_aloc = ["Desalocado", "1 Alocação", "2 Alocações", "3 Alocações", "4+ Alocações"]
-            aloc_filtro = colaloc.selectbox("**Filtrar por Número de Alocações**", options=opcoes_aloc, placeholder="Alocações", index=None)
-
-            # --- Aplicação dos Filtros ---
-            df['Contagem Alocações'] = calculo_alocacoes(df)
-            if nome_filtro in opcoes_nome:
-                df = df[df["Membro"] == nome_filtro]
-            if cargo_filtro in opcoes_cargo:
-                df = df[df["Cargo no núcleo"] == cargo_filtro]
-            if aloc_filtro:
-                map_aloc = {"Desalocado": 0, "1 Alocação": 1, "2 Alocações": 2, "3 Alocações": 3}
-                if aloc_filtro in map_aloc:
-                    df = df[df['Contagem Alocações'] == map_aloc[aloc_filtro]]
-                elif aloc_filtro == "4+ Alocações":
-                    df = df[df['Contagem Alocações'] >= 4]
+            map_aloc = {"Desalocado": 0, "1 Alocação": 1, "2 Alocações": 2, "3 Alocações": 3, "4+ Alocações": 4}
+            aloc_filtro = colaloc.selectbox("**Filtrar por Número de Alocações**", options=list(map_aloc), placeholder="Alocações", index=None)
+
+            # --- Aplicação dos Filtros (interseção dos índices; o quadro compartilhado não é alterado) ---
+            posicoes = aplicar_filtros(indices, cargo=cargo_filtro if indices["cargo"] else None,
+                                       membro=nome_filtro, alocacoes=map_aloc.get(aloc_filtro))
+            if posicoes is not None:
+                df = df.iloc[posicoes]
 
             # --- Exibição dos Dados ---
-            st.dataframe(df.drop(columns=["Contagem Alocações"], errors = 'ignore'), hide_index=True)
+            st.dataframe(df, hide_index=True)
 
             if len(df) == 1:
                 st.markdown("---")
                 # Chama a nova função para desenhar o gráfico para aquele membro
-                exibir_gantt_membro(df_membro=df, nucleo_selecionado=st.session_state.nucleo, cores_por_nucleo=nucleo_cores)
+                exibir_gantt_membro(df_membro=df, nucleo_selecionado=st.session_state.nucleo, cores_por_nucleo=nucleo_cores, intervalos=intervalos)
+            elif len(df) > 1:
+                # Só monta (e envia ao navegador) a figura quando pedida, e uma vez por versão dos dados e filtros
+                if st.toggle("Linha do tempo da equipe"):
+                    exibir_gantt_equipe(df, st.session_state.nucleo, nucleo_cores, intervalos,
+                                        chave=chave_indices + (cargo_filtro, nome_filtro, aloc_filtro))
     
     else:
         st.info("Por favor, selecione um núcleo para visualizar a base de dados.")
@@ -484,7 +450,9 @@ if pagina == "PCP":
         st.warning("Por favor, selecione um núcleo primeiro.", icon="⚠️")
         st.stop()
 
-    df = escolher_nucleo(st.session_state.nucleo)
+    # Chave da etapa base: versão dos dados + núcleo; as etapas seguintes estendem essa chave
+    chave_base = (carregar_dados_sessao(), nome_aba(st.session_state.nucleo))
+    df = memo_etapa("base", chave_base, lambda: escolher_nucleo(st.session_state.nucleo))
     if df.empty:
         st.warning(f"Nenhum dado encontrado para o núcleo: {st.session_state.nucleo}", icon="⚠️")
         st.stop()
@@ -492,12 +460,8 @@ if pagina == "PCP":
     # --- Filtros da Página PCP ---
     colport, col2, col3 = st.columns(3)
 
-    portfolios = { #rever portfolios
-        "NCiv": ["Completo", "Design de Interiores", "HEE", "Sondagem"], 
-        "NCon": ["Gestão de Processos", "Pesquisa de Mercado", "Planejamento Estratégico"],
-        "NDados": ["Ciência de Dados", "Engenharia de Dados", "Inteligência Artificial", "Inteligência de Negócios", "DSaaS"],
-        "NI": ["Inovacamp", "VBaaS", "Quick Inovation"],
-        "NTec": ["Product Discovery", "Desenvolvimento", "Escopo Aberto"]}
+    portfolios = dict(PORTFOLIOS)
+    portfolios[TODOS_NUCLEOS] = sorted({p for lista in portfolios.values() for p in lista})
     escopo = colport.selectbox("**Portfólio**", options=portfolios[st.session_state.nucleo], index= None, placeholder="Selecione o portfólio")
     analistas = sorted(df["Membro"].unique())
     analistas_selecionados = col2.multiselect("**Analistas**", options=analistas, default=[], placeholder="Selecione os analistas")
@@ -536,20 +500,32 @@ if pagina == "PCP":
             min_value=inicio_proj,      # Garante que a data de fim não seja anterior ao início
             format="DD/MM/YYYY")
 
-    # --- Cálculos das Métricas ---
-    df["Disponibilidade"] = calculo_disponibilidade(df, pd.Timestamp(inicio_proj))
-    df["Afinidade"] = calculo_afinidade(df, escopo)
-    
-    max_disp, min_disp = 30, df["Disponibilidade"].min()
-    range_disp = max_disp - min_disp if max_disp > min_disp else 1
-    df["Nota Disponibilidade"] = 10 * (df["Disponibilidade"] - min_disp) / range_disp
-    df["Nota Final"] = (df["Afinidade"] * peso_afin) + (df["Nota Disponibilidade"] * peso_disp)
+    rotulo_criterio = st.radio("**Disponibilidade considerada**", options=list(CRITERIOS_DISPONIBILIDADE), horizontal=True)
+    criterio = CRITERIOS_DISPONIBILIDADE[rotulo_criterio]
+
+    # --- Cálculos das Métricas (cada etapa só é refeita quando as suas entradas mudam) ---
+    chave_disp = chave_base + (inicio_proj, fim_proj, criterio)
+    chave_afin = chave_base + (escopo,)
+    disponibilidade = memo_etapa("disponibilidade", chave_disp, lambda: calculo_disponibilidade_periodo(
+        df, pd.Timestamp(inicio_proj), pd.Timestamp(fim_proj), escolher_alocacoes(st.session_state.nucleo), criterio))
+    nota_disp = memo_etapa("nota_disponibilidade", chave_disp, lambda: nota_disponibilidade(disponibilidade))
+    afinidade = memo_etapa("afinidade", chave_afin, lambda: calculo_afinidade(df, escopo))
+    nota_final = memo_etapa("nota_final", chave_disp + (escopo, peso_disp, peso_afin),
+                            lambda: (afinidade * peso_afin) + (nota_disp * peso_disp))
+
+    # Quadro enxuto só com o que os cards usam; o DataFrame base memorizado não é alterado
+    pontuacao = pd.DataFrame({"Membro": df["Membro"], "Disponibilidade": disponibilidade,
+                              "Nota Disponibilidade": nota_disp, "Afinidade": afinidade, "Nota Final": nota_final})
+    if st.session_state.nucleo == TODOS_NUCLEOS:
+        # Ranking global: uma única passada sobre todas as abas, com o detalhamento por núcleo
+        pontuacao.insert(0, "Núcleo", df["Núcleo"])
+        pontuacao = pontuacao.reset_index(drop=True)
 
     # --- Filtro e Médias para Exibição ---
     if "Todos" in analistas_selecionados or not analistas_selecionados:
-        df_filtrado = df
+        df_filtrado = pontuacao
     else:
-        df_filtrado = df[df["Membro"].isin(analistas_selecionados)]
+        df_filtrado = pontuacao[pontuacao["Membro"].isin(analistas_selecionados)]
 
     avg_disp = df_filtrado["Disponibilidade"].mean() if not df_filtrado.empty else 0
     avg_afin = df_filtrado["Afinidade"].mean() if not df_filtrado.empty else 0
@@ -563,7 +539,7 @@ if pagina == "PCP":
     <div style="margin-bottom: 20px">
     <p><strong>Entendendo as pontuações:</strong></p>
     <ul>
-      <li><strong>Disponibilidade</strong>: Horas estimadas disponíveis para novas atividades (Máximo: 30h)</li>
+      <li><strong>Disponibilidade</strong>: Horas semanais estimadas disponíveis para novas atividades durante o projeto (Máximo: 30h)</li>
       <li><strong>Afinidade</strong>: Pontuação (0-10) baseada em satisfação com portfólio, capacidade técnica e saúde mental</li>
       <li><strong>Nota Final</strong>: Média ponderada entre disponibilidade e afinidade</li>
     </ul>
@@ -571,6 +547,10 @@ if pagina == "PCP":
     """, 
         unsafe_allow_html=True,)
     
+    if st.session_state.nucleo == TODOS_NUCLEOS and not df_filtrado.empty:
+        st.markdown("**Resumo por Núcleo**")
+        st.dataframe(resumo_por_nucleo(df_filtrado), hide_index=True)
+
     # Aviso da Média do Núcleo
     if avg_afin < 5.0 or avg_disp < 15.0:
         nome_media = "média.do.núcleo ⚠"
@@ -584,11 +564,147 @@ if pagina == "PCP":
     "Afinidade": avg_afin,
     "Nota Final": avg_nota_final
     }
-    df_filtrado.loc['media'] = dados_da_media
 
-    # Organização e exibição dos Cards da maior nota final para a menor
-    display_df = df_filtrado.sort_values(by="Nota Final", ascending=False)
+    # A paginação volta ao início quando muda o núcleo ou a versão dos dados
+    if st.session_state.get("pcp_cards_chave") != chave_base:
+        st.session_state.pcp_cards_chave = chave_base
+        st.session_state.pcp_cards_limite = CARDS_POR_PAGINA
+
+    # Seleciona só os melhores antes de ordenar; o card da média entra na sua posição dentro da página
+    display_df = df_filtrado.nlargest(st.session_state.pcp_cards_limite, "Nota Final")
+    restantes = len(df_filtrado) - len(display_df)
+    display_df = pd.concat([display_df, pd.DataFrame([dados_da_media], index=['media'])])
+    display_df = display_df.sort_values(by="Nota Final", ascending=False, kind="stable")
+
+    # Todos os cards da página vão em um único bloco HTML
+    with medir_etapa("html_cards", aba_atual()):
+        html_pagina = html_cards(display_df, avg_disp, avg_afin, nucleo_cores.get(st.session_state.nucleo))
+    st.markdown(html_pagina, unsafe_allow_html=True)
+
+    if restantes > 0:
+        st.button(f"Carregar mais ({restantes} restantes)", on_click=lambda: st.session_state.update(
+            pcp_cards_limite=st.session_state.pcp_cards_limite + CARDS_POR_PAGINA))
+        
+
+    # --- Sensibilidade aos Pesos (toda a faixa de uma vez, sem reexecutar a página) ---
+    st.markdown("---")
+    with st.expander("Sensibilidade do ranking aos pesos"):
+        top_n = st.number_input("**Tamanho do top**", min_value=1, max_value=max(1, len(df_filtrado)), value=min(5, max(1, len(df_filtrado))), step=1)
+        posicoes, estabilidade, trocas = memo_etapa(
+            "sensibilidade", chave_disp + (escopo, top_n, tuple(analistas_selecionados)),
+            lambda: sensibilidade_pesos(df_filtrado, top=top_n))
+        with medir_etapa("figura_sensibilidade", aba_atual()):
+            fig_sensibilidade = figura_sensibilidade(posicoes, estabilidade, peso_disp)
+        st.plotly_chart(fig_sensibilidade, use_container_width=True)
+        colestab, coltrocas = st.columns(2)
+        colestab.markdown(f"**Estabilidade do top {top_n}**")
+        colestab.dataframe(estabilidade, hide_index=True)
+        coltrocas.markdown("**Pesos em que o top muda**")
+        if trocas.empty:
+            coltrocas.info(f"O top {top_n} é o mesmo em toda a faixa de pesos.")
+        else:
+            coltrocas.dataframe(trocas, hide_index=True)
+
+    # --- Varredura de Datas de Início ---
+    st.markdown("---")
+    with st.expander("Encontrar a melhor data de início"):
+        colsemanas, colequipe = st.columns(2)
+        semanas = colsemanas.slider("**Semanas avaliadas a partir do início**", min_value=1, max_value=26, value=8)
+        selecionou = bool(analistas_selecionados) and "Todos" not in analistas_selecionados
+        tamanho_equipe = colequipe.number_input(
+            "**Tamanho da equipe**", min_value=1, value=3, step=1, disabled=selecionou,
+            help="Sem analistas selecionados, a equipe são os membros de maior nota em cada data.")
+        membros = df.index[df["Membro"].isin(analistas_selecionados)] if selecionou else None
+        datas = pd.date_range(inicio_proj, periods=semanas * 7)
+        melhor, curva = memo_etapa(
+            "varredura", chave_afin + (inicio_proj, semanas, tamanho_equipe, peso_disp, peso_afin, tuple(analistas_selecionados)),
+            lambda: varrer_datas_inicio(df, escolher_alocacoes(st.session_state.nucleo), datas, escopo,
+                                        peso_disp, peso_afin, membros, tamanho_equipe))
+        if melhor is None:
+            st.info("Nenhum membro para avaliar neste período.")
+        else:
+            st.success(f"Melhor data de início: {melhor:%d/%m/%Y} "
+                       f"({curva.loc[melhor, 'Disponibilidade Média']:.1f}h disponíveis em média na equipe)")
+            st.line_chart(curva)
+
+    # --- Escalação de Vários Projetos Simultâneos ---
+    st.markdown("---")
+    with st.expander("Escalar vários projetos simultâneos"):
+        st.caption("Distribui os membros entre os projetos maximizando a soma das notas finais, "
+                   "sem passar das horas restantes de cada um.")
+        projetos = st.data_editor(
+            pd.DataFrame({"projeto": ["Projeto 1"], "portfolio": [escopo], "inicio": [inicio_proj],
+                          "fim": [fim_proj], "vagas": [2]}),
+            num_rows="dynamic", hide_index=True, key="pcp_projetos",
+            column_config={
+                "projeto": st.column_config.TextColumn("Projeto", required=True),
+                "portfolio": st.column_config.SelectboxColumn("Portfólio", options=portfolios[st.session_state.nucleo]),
+                "inicio": st.column_config.DateColumn("Início", format="DD/MM/YYYY", required=True),
+                "fim": st.column_config.DateColumn("Fim", format="DD/MM/YYYY"),
+                "vagas": st.column_config.NumberColumn("Vagas", min_value=1, step=1, required=True),
+            })
+        if st.button("Otimizar escalação"):
+            projetos = projetos.dropna(subset=["projeto", "inicio", "vagas"]).assign(peso_disp=peso_disp, peso_afin=peso_afin)
+            if projetos.empty:
+                st.info("Preencha ao menos um projeto com início e vagas.")
+            else:
+                escalacao = escalar_projetos(df, escolher_alocacoes(st.session_state.nucleo), projetos, criterio=criterio)
+                faltam = int(projetos["vagas"].sum()) - len(escalacao)
+                if faltam > 0:
+                    st.warning(f"{faltam} vaga(s) ficaram sem membro com horas disponíveis.", icon="⚠️")
+                st.dataframe(escalacao.reset_index(drop=True), hide_index=True)
 
-    for _, row in display_df.iterrows():
-        card_membro(row, avg_disp, avg_afin, nucleo_cores.get(st.session_state.nucleo))
-        
\ No newline at end of file
+# --------------------------
+# --- PÁGINA: HISTÓRICO ---
+# --------------------------
+
+if pagina == "Histórico":
+    if not st.session_state.nucleo:
+        st.warning("Por favor, selecione um núcleo primeiro.", icon="⚠️")
+        st.stop()
+
+    # A consulta lê só o banco do histórico (pelos índices), sem recarregar a planilha nem os snapshots
+    nucleos = ABAS_NUCLEOS if st.session_state.nucleo == TODOS_NUCLEOS else [nome_aba(st.session_state.nucleo)]
+    colmetrica, colmembro, colperiodo = st.columns(3)
+    metrica = colmetrica.selectbox("**Métrica**", options=list(METRICAS_HISTORICO), format_func=METRICAS_HISTORICO.get)
+    membro = colmembro.selectbox("**Membro**", options=membros_historico(ARQUIVO_HISTORICO, nucleos), index=None,
+                                 placeholder="Média do núcleo")
+    hoje = datetime.today().date()
+    periodo = colperiodo.date_input("**Período**", value=((pd.Timestamp(hoje) - pd.DateOffset(months=6)).date(), hoje), format="DD/MM/YYYY")
+    if len(periodo) < 2:
+        st.stop()
+
+    with medir_etapa("historico_consulta", aba_atual()):
+        historico = consultar_historico(ARQUIVO_HISTORICO, nucleos, membro=membro, inicio=periodo[0],
+                                        fim=pd.Timestamp(periodo[1]) + pd.Timedelta(days=1))
+    if historico.empty:
+        st.info("Nenhuma carga registrada no histórico para esta seleção e período.")
+    else:
+        st.plotly_chart(figura_historico(historico, metrica), use_container_width=True)
+        if membro is None:
+            st.caption("Média dos membros de cada núcleo em cada carga registrada.")
+
+# --- Idade dos Dados ---
+idade = idade_dados(st.session_state.nucleo) if st.session_state.nucleo else None
+if idade is not None:
+    minutos = int(idade.total_seconds() // 60)
+    texto_idade = "agora mesmo" if minutos < 1 else f"há {minutos} min" if minutos < 120 else f"há {minutos // 60} h"
+    aviso_idade.caption(f"Dados conferidos com a planilha {texto_idade}")
+
+# --- Diagnóstico de Desempenho ---
+with st.sidebar.expander("Diagnóstico de desempenho"):
+    etapas = [{"Etapa": etapa, "Aba": aba, "Execuções": m["contagem"], "Média (ms)": m["soma_s"] / m["contagem"] * 1000,
+               "Máximo (ms)": m["max_s"] * 1000, "Total (s)": m["soma_s"]} for (etapa, aba), m in metricas_etapas().items()]
+    if etapas:
+        st.dataframe(pd.DataFrame(etapas).sort_values("Total (s)", ascending=False), hide_index=True)
+    caches = pd.Series(metricas_cache(), dtype="int64")
+    if not caches.empty:
+        caches = caches.unstack(fill_value=0).reindex(columns=["acerto", "falta"], fill_value=0)
+        caches["Taxa de acerto"] = caches["acerto"] / caches.sum(axis=1)
+        st.dataframe(caches.rename_axis("Cache").reset_index(), hide_index=True)
+    bytes_abas = estado_carga()["bytes_abas"]
+    if bytes_abas:
+        st.dataframe(pd.DataFrame([{"Aba": aba, "Antes (MiB)": antes / 2**20, "Compactada (MiB)": depois / 2**20,
+                                    "Redução": f"{antes / max(depois, 1):.1f}x"}
+                                   for aba, (antes, depois) in bytes_abas.items()]), hide_index=True)
+    st.caption(f"Exportado para o Prometheus em {ARQUIVO_METRICAS} a cada {INTERVALO_EXPORTACAO_S}s.")
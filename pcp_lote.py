@@ -0,0 +1,204 @@
+# ==============================================================================
+# PCP EM LOTE: PONTUA VÁRIOS PEDIDOS DE PROJETO DE UMA VEZ (LINHA DE COMANDO)
+# ==============================================================================
+# Uso:
+#   python pcp_lote.py pedidos.csv ranking.parquet [--snapshot .pcp_cache | --snapshot ""] [--credenciais conta.json]
+#                      [--planilha-id ID] [--fonte csv --caminho-fonte dados/pcp]
+#                      [--top 10] [--workers 4] [--escalar] [--metricas pcp.prom] [--historico historico.sqlite]
+#
+# O arquivo de pedidos (CSV ou JSON Lines) tem uma linha por projeto, com as colunas
+# nucleo, portfolio, inicio e fim e, opcionalmente, projeto, peso_disp e peso_afin.
+# A saída é um ranking por projeto, em CSV ou Parquet conforme a extensão do arquivo.
+# Com --escalar, os pedidos são tratados como projetos simultâneos (coluna vagas
+# obrigatória) e a saída é a escalação que maximiza a soma das notas finais.
+# Com --metricas, o tempo de cada etapa é gravado no formato de texto do Prometheus.
+# Com --historico, a carga é registrada no histórico (o mesmo banco da página Histórico).
+
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from motor_pcp import (
+    ABAS_NUCLEOS, DIRETORIO_SNAPSHOT, TIPOS_FONTE, TODOS_NUCLEOS,
+    abrir_fonte, carregar_snapshot, carregar_todas_abas, concatenar_abas, concatenar_alocacoes, diretorio_snapshot,
+    escalar_projetos, identificador_fonte, medir_etapa, metricas_google, nome_aba, novo_estado_carga, pontuar_projeto,
+    salvar_prometheus, tabela_alocacoes,
+)
+
+COLUNAS_OBRIGATORIAS = ["nucleo", "portfolio", "inicio", "fim"]
+MIN_PEDIDOS_PARALELO = 50  # Abaixo disso, abrir processos custa mais do que pontuar
+
+_DADOS = {}  # Dados preparados de cada processo (preenchidos por _iniciar_worker)
+
+
+def carregar_dados(snapshot=None, credenciais=None, planilha_id=None, fonte="sheets", caminho_fonte=None,
+                   historico=None):
+    """Carrega as abas do snapshot local e revalida contra a fonte: uma fonte local ou, com credenciais, a planilha.
+
+    Sem `snapshot`, usa o diretório da fonte (`diretorio_snapshot`): uma fonte local nunca lê nem grava o
+    snapshot da planilha servido pela interface. `snapshot=""` desliga o snapshot.
+    """
+    if snapshot is None:
+        snapshot = diretorio_snapshot(fonte, caminho_fonte)
+    estado = novo_estado_carga(Path(snapshot) if snapshot else None, historico=historico,
+                               fonte=identificador_fonte(fonte, caminho_fonte))
+    if snapshot:
+        carregar_snapshot(estado)
+
+    if fonte != "sheets":
+        return carregar_todas_abas(abrir_fonte(fonte, caminho_fonte), estado=estado)
+    if credenciais:
+        creds_info = json.loads(Path(credenciais).read_text(encoding="utf-8"))
+        return carregar_todas_abas(abrir_fonte(creds_info=creds_info, chave=planilha_id), estado=estado)
+    if not estado["abas"]:
+        raise SystemExit(f"Nenhum snapshot encontrado em '{snapshot}'. Informe --credenciais para ler a planilha.")
+    return {aba: estado["abas"].get(aba, pd.DataFrame()) for aba in ABAS_NUCLEOS}
+
+def preparar_dados(todas_abas):
+    """Monta a tabela de alocações de cada aba e do modo "Todos" (as abas já vêm sem colunas vazias)."""
+    alocacoes = {aba: tabela_alocacoes(df) for aba, df in todas_abas.items()}
+    dados = {aba: (df, alocacoes[aba]) for aba, df in todas_abas.items()}
+    dados[TODOS_NUCLEOS] = (concatenar_abas(todas_abas), concatenar_alocacoes(alocacoes))
+    return dados
+
+def ler_data(serie):
+    """Aceita datas em DD/MM/AAAA ou AAAA-MM-DD."""
+    return pd.to_datetime(serie, format="%d/%m/%Y", errors="coerce").fillna(
+        pd.to_datetime(serie, format="ISO8601", errors="coerce"))
+
+def ler_pedidos(caminho):
+    """Lê e valida o arquivo de pedidos (CSV ou JSON Lines)."""
+    caminho = Path(caminho)
+    if caminho.suffix.lower() in (".jsonl", ".json"):
+        pedidos = pd.read_json(caminho, lines=True, dtype=False)
+    else:
+        pedidos = pd.read_csv(caminho, dtype=str)
+
+    faltantes = [col for col in COLUNAS_OBRIGATORIAS if col not in pedidos.columns]
+    if faltantes:
+        raise SystemExit(f"Colunas obrigatórias ausentes no arquivo de pedidos: {faltantes}")
+
+    if "projeto" not in pedidos.columns:
+        pedidos["projeto"] = np.arange(1, len(pedidos) + 1)
+    pedidos["nucleo"] = pedidos["nucleo"].astype(str).map(nome_aba)
+    pedidos["inicio"] = ler_data(pedidos["inicio"])
+    pedidos["fim"] = ler_data(pedidos["fim"])
+
+    # Pesos: padrão 0.5/0.5; se só um for informado, o outro completa 1.0
+    vazio = pd.Series(np.nan, index=pedidos.index)
+    peso_disp = pd.to_numeric(pedidos["peso_disp"], errors="coerce") if "peso_disp" in pedidos else vazio
+    peso_afin = pd.to_numeric(pedidos["peso_afin"], errors="coerce") if "peso_afin" in pedidos else vazio
+    pedidos["peso_disp"] = peso_disp.fillna(1.0 - peso_afin).fillna(0.5)
+    pedidos["peso_afin"] = peso_afin.fillna(1.0 - pedidos["peso_disp"])
+
+    invalidos = pedidos["inicio"].isna() | ~pedidos["nucleo"].isin(ABAS_NUCLEOS + [TODOS_NUCLEOS])
+    for pedido in pedidos[invalidos].itertuples():
+        logging.error(f"Pedido '{pedido.projeto}' ignorado: núcleo ou data de início inválidos.")
+    return pedidos[~invalidos]
+
+def _iniciar_worker(dados):
+    global _DADOS
+    _DADOS = dados
+
+def pontuar_pedidos(pedidos, top=None):
+    """Pontua cada pedido contra os dados do processo e devolve os rankings empilhados."""
+    rankings = []
+    for pedido in pedidos.itertuples(index=False):
+        df, intervalos = _DADOS[pedido.nucleo]
+        if df.empty:
+            continue
+        ranking = pontuar_projeto(df, intervalos, pedido.inicio, pedido.portfolio, pedido.peso_disp, pedido.peso_afin,
+                                  fim_proj=pedido.fim)
+        # Seleção parcial dos melhores antes de ordenar, em vez de ordenar o núcleo inteiro
+        ranking = ranking.nlargest(top, "Nota Final") if top else ranking.sort_values("Nota Final", ascending=False)
+        ranking = ranking.reset_index(drop=True)
+        if "Núcleo" not in ranking.columns:
+            ranking.insert(0, "Núcleo", pedido.nucleo)
+        ranking.insert(0, "Posição", np.arange(1, len(ranking) + 1))
+        pedido_info = pd.DataFrame({"Projeto": pedido.projeto, "Núcleo do Projeto": pedido.nucleo,
+                                    "Portfólio": pedido.portfolio, "Início": pedido.inicio, "Fim": pedido.fim},
+                                   index=ranking.index)
+        rankings.append(pd.concat([pedido_info, ranking], axis=1))
+    return pd.concat(rankings, ignore_index=True) if rankings else pd.DataFrame()
+
+def pontuar_em_lote(pedidos, dados, top=None, workers=None):
+    """Pontua todos os pedidos, dividindo lotes grandes entre vários processos."""
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(pedidos) < MIN_PEDIDOS_PARALELO:
+        _iniciar_worker(dados)
+        return pontuar_pedidos(pedidos, top)
+
+    # Cada processo recebe os dados uma única vez, no início, e pontua vários blocos de pedidos;
+    # blocos contíguos mantêm a saída na ordem do arquivo de pedidos
+    tamanho = -(-len(pedidos) // (workers * 4))
+    blocos = [pedidos.iloc[i:i + tamanho] for i in range(0, len(pedidos), tamanho)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker, initargs=(dados,)) as executor:
+        partes = [parte for parte in executor.map(pontuar_pedidos, blocos, repeat(top)) if not parte.empty]
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+def escalar_pedidos(pedidos, dados):
+    """Escala os pedidos como projetos simultâneos, disputando as mesmas horas dos membros."""
+    if "vagas" not in pedidos.columns:
+        raise SystemExit("A escalação exige a coluna 'vagas' no arquivo de pedidos.")
+    pedidos = pedidos.assign(vagas=pd.to_numeric(pedidos["vagas"], errors="coerce").fillna(1))
+
+    # Pedidos de um único núcleo usam a aba dele; pedidos mistos disputam o quadro global
+    nucleos = pedidos["nucleo"].unique()
+    df, intervalos = dados[nucleos[0] if len(nucleos) == 1 else TODOS_NUCLEOS]
+    if df.empty:
+        return pd.DataFrame()
+    return escalar_projetos(df, intervalos, pedidos).reset_index(drop=True)
+
+def salvar_ranking(ranking, caminho):
+    """Grava o ranking em Parquet ou CSV, conforme a extensão."""
+    caminho = Path(caminho)
+    if caminho.suffix.lower() == ".parquet":
+        ranking.to_parquet(caminho, index=False)
+    else:
+        ranking.to_csv(caminho, index=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pontua em lote vários pedidos de projeto do PCP.")
+    parser.add_argument("pedidos", help="Arquivo de pedidos (.csv ou .jsonl)")
+    parser.add_argument("saida", help="Arquivo de saída (.csv ou .parquet)")
+    parser.add_argument("--snapshot", help=f"Diretório do snapshot local das abas (padrão: {DIRETORIO_SNAPSHOT} para a "
+                                           "planilha, um subdiretório próprio para cada fonte local; \"\" desliga)")
+    parser.add_argument("--credenciais", help="JSON da conta de serviço, para ler a planilha do Google")
+    parser.add_argument("--planilha-id", help="Chave (ID) da planilha; sem ela, a planilha é buscada pelo nome")
+    parser.add_argument("--fonte", choices=TIPOS_FONTE, default="sheets", help="Fonte dos dados (padrão: a planilha do Google)")
+    parser.add_argument("--caminho-fonte", help="Pasta (csv, parquet) ou arquivo (sqlite) da fonte local")
+    parser.add_argument("--top", type=int, help="Quantidade de membros por projeto (padrão: todos)")
+    parser.add_argument("--workers", type=int, help="Processos para lotes grandes (padrão: número de CPUs)")
+    parser.add_argument("--escalar", action="store_true", help="Escala os pedidos como projetos simultâneos")
+    parser.add_argument("--metricas", help="Arquivo .prom para gravar as métricas de tempo por etapa")
+    parser.add_argument("--historico", help="Banco SQLite do histórico onde registrar a carga (ex.: .pcp_cache/historico.sqlite)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    pedidos = ler_pedidos(args.pedidos)
+    with medir_etapa("carga_lote"):
+        dados = preparar_dados(carregar_dados(args.snapshot, args.credenciais, args.planilha_id, args.fonte, args.caminho_fonte,
+                                              args.historico))
+    for operacao, contadores in metricas_google().items():
+        logging.info(f"Google {operacao}: {contadores['chamadas']} chamadas, {contadores['retentativas']} retentativas, "
+                     f"{contadores['falhas']} falhas, {contadores['espera_s']:.1f}s de espera")
+    with medir_etapa("escalar_lote" if args.escalar else "pontuar_lote"):
+        if args.escalar:
+            ranking = escalar_pedidos(pedidos, dados)
+        else:
+            ranking = pontuar_em_lote(pedidos, dados, top=args.top, workers=args.workers)
+    salvar_ranking(ranking, args.saida)
+    if args.metricas:
+        salvar_prometheus(args.metricas)
+    logging.info(f"{len(pedidos)} pedidos pontuados; ranking salvo em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()